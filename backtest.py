@@ -0,0 +1,225 @@
+import json
+import itertools
+import time
+import numpy as np
+import pandas as pd
+from numba import njit, prange, set_num_threads, config
+from sklearn.preprocessing import StandardScaler
+from logitRegression15 import (clean_and_index_races, build_race_segments, race_folds,
+                               fit_coefficients, FIT_THREADS)
+from racePrediction import predict_card_outcomes
+from betEngine import build_bet_table
+from modelRegistry import get_model
+
+# Filter and staking parameters, in the column order the simulator expects,
+# with the defaults of findBets2.generate_betting_recommendations
+PARAMS = ('min_edge', 'max_edge', 'min_odds', 'max_odds', 'min_prob', 'max_stake')
+DEFAULT_PARAMS = {'min_edge': 0.1, 'max_edge': 0.3, 'min_odds': 1.0, 'max_odds': 7.0,
+                  'min_prob': 0.0, 'max_stake': 0.05}
+METRICS = ('final_bankroll', 'n_bets', 'staked', 'max_drawdown')
+
+# ----------------------------
+# 1. Out-of-sample Predictions
+# ----------------------------
+
+def load_history(filepaths):
+    """Settled races from one or more JSON files, kept in file (chronological) order"""
+    frames = []
+    for filepath in filepaths:
+        with open(filepath, "r") as f:
+            frames.append(pd.DataFrame(json.load(f)))
+    races, _ = clean_and_index_races(pd.concat(frames, ignore_index=True))
+    return races.sort_values(['race_idx', 'rank'], kind='stable').reset_index(drop=True)
+
+def walk_forward_predictions(races, features, λ, n_folds=5, n_threads=FIT_THREADS):
+    """Win/top-2/top-3 probabilities for every race after the first block, all out of sample
+
+    Races are cut into n_folds + 1 chronological blocks (race_folds with
+    walk_forward=True); each block is predicted with a scaler and coefficients
+    fitted only on the blocks before it.
+    """
+    race_indices = races['race_idx'].values
+    ranks = races['rank'].values
+    keep = [c for c in ('race_idx', 'race_id', 'horse_id', 'logOdds', 'rank') if c in races]
+
+    parts = []
+    beta = None
+    for fold, (train_idx, val_idx) in enumerate(race_folds(race_indices, n_folds, walk_forward=True)):
+        # Fitted on a frame so the scaler keeps feature names for predict_card_outcomes
+        train = races.iloc[train_idx][features]
+        scaler = StandardScaler().fit(train)
+        segments = build_race_segments(race_indices[train_idx], ranks[train_idx])
+        result = fit_coefficients(scaler.transform(train), segments, λ,
+                                  beta0=beta, n_threads=n_threads)
+        beta = result.x
+
+        block = races.iloc[val_idx]
+        probs = predict_card_outcomes(block, beta, scaler, features, race_col='race_idx')
+        parts.append(block[keep].join(probs).assign(fold=fold))
+    return pd.concat(parts, ignore_index=True)
+
+# ----------------------------
+# 2. Bankroll Simulation
+# ----------------------------
+
+def prepare_replay(predictions):
+    """Per-runner simulator arrays in race order, using the live edge and Kelly rules
+
+    Races with fewer than two runners are dropped, as in the bet finders.
+    """
+    table = build_bet_table(predictions, bankroll=1.0, max_stake=1.0, max_real_stake=np.inf,
+                            race_col='race_idx')
+    table = table[table['field_size'] >= 2].reset_index(drop=True)
+    race_offsets, _ = build_race_segments(table['race_idx'].values, table['rank'].values)
+    return {
+        'table': table,
+        'race_offsets': race_offsets,
+        'edge': table['edge'].values.astype(np.float64),
+        'decimal_odds': table['decimal_odds'].values.astype(np.float64),
+        'model_prob_win': table['model_prob_win'].values.astype(np.float64),
+        'kelly_fraction': table['kelly_fraction'].values.astype(np.float64),
+        'won': (table['rank'].values == 1),
+    }
+
+@njit(cache=True)
+def _simulate_config(params, race_offsets, edge, odds, p_win, kelly, won, bankroll, max_real_stake, path):
+    """Replay every race for one parameter row; fills path (if non-empty) with the bankroll after each race
+
+    Stakes within a race are sized from the bankroll at the start of the race
+    and scaled down together if they would exceed it.
+    """
+    min_edge, max_edge = params[0], params[1]
+    min_odds, max_odds = params[2], params[3]
+    min_prob, max_stake = params[4], params[5]
+
+    peak = bankroll
+    max_drawdown = 0.0
+    n_bets = 0
+    staked = 0.0
+    for r in range(len(race_offsets) - 1):
+        total = 0.0
+        returns = 0.0
+        if bankroll > 0.0:
+            for j in range(race_offsets[r], race_offsets[r + 1]):
+                if (edge[j] < min_edge or edge[j] > max_edge or odds[j] < min_odds
+                        or odds[j] > max_odds or not p_win[j] > min_prob):
+                    continue
+                fraction = min(kelly[j], max_stake)
+                if not fraction > 0.0:
+                    continue
+                stake = min(fraction * bankroll, max_real_stake)
+                total += stake
+                if won[j]:
+                    returns += stake * odds[j]
+                n_bets += 1
+            if total > bankroll:
+                returns *= bankroll / total
+                total = bankroll
+
+        bankroll += returns - total
+        staked += total
+        peak = max(peak, bankroll)
+        if peak > 0.0:
+            max_drawdown = max(max_drawdown, 1.0 - bankroll / peak)
+        if len(path):
+            path[r] = bankroll
+    return bankroll, n_bets, staked, max_drawdown
+
+@njit(parallel=True, cache=True)
+def _simulate_grid(grid, race_offsets, edge, odds, p_win, kelly, won, bankroll, max_real_stake):
+    """_simulate_config for every row of grid, one prange iteration per configuration"""
+    out = np.empty((grid.shape[0], 4))
+    no_path = np.empty(0)
+    for c in prange(grid.shape[0]):
+        final, n_bets, staked, drawdown = _simulate_config(
+            grid[c], race_offsets, edge, odds, p_win, kelly, won, bankroll, max_real_stake, no_path)
+        out[c, 0] = final
+        out[c, 1] = n_bets
+        out[c, 2] = staked
+        out[c, 3] = drawdown
+    return out
+
+def _kernel_args(replay):
+    return (replay['race_offsets'], replay['edge'], replay['decimal_odds'],
+            replay['model_prob_win'], replay['kelly_fraction'], replay['won'])
+
+def _param_row(params):
+    unknown = set(params) - set(PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown backtest parameters: {', '.join(sorted(unknown))}")
+    return np.array([params.get(p, DEFAULT_PARAMS[p]) for p in PARAMS], dtype=np.float64)
+
+def replay_bankroll(replay, bankroll=100.0, max_real_stake=50, **params):
+    """Chronological replay of one configuration
+
+    Returns (summary dict, bankroll after each race as a Series indexed by race_idx).
+    """
+    n_races = len(replay['race_offsets']) - 1
+    path = np.empty(n_races)
+    final, n_bets, staked, drawdown = _simulate_config(
+        _param_row(params), *_kernel_args(replay), float(bankroll), float(max_real_stake), path)
+
+    race_idx = replay['table']['race_idx'].values[replay['race_offsets'][:-1]]
+    summary = dict(zip(METRICS, (final, n_bets, staked, drawdown)))
+    summary['roi'] = (final - bankroll) / staked if staked else 0.0
+    return summary, pd.Series(path, index=race_idx, name='bankroll')
+
+# ----------------------------
+# 3. Parameter Sweeps
+# ----------------------------
+
+def parameter_grid(**values):
+    """Cartesian product of per-parameter value lists as a (configs, len(PARAMS)) array
+
+    Parameters that are not given keep their findBets2 defaults.
+    """
+    _param_row({p: 0.0 for p in values})  # reject unknown names
+    axes = [np.atleast_1d(values.get(p, DEFAULT_PARAMS[p])) for p in PARAMS]
+    return np.array(list(itertools.product(*axes)), dtype=np.float64)
+
+def sweep(replay, grid, bankroll=100.0, max_real_stake=50, n_threads=config.NUMBA_NUM_THREADS):
+    """Simulate every configuration in grid across n_threads cores; best final bankroll first"""
+    set_num_threads(min(n_threads, config.NUMBA_NUM_THREADS))
+    grid = np.ascontiguousarray(grid, dtype=np.float64)
+    out = _simulate_grid(grid, *_kernel_args(replay), float(bankroll), float(max_real_stake))
+
+    results = pd.DataFrame(grid, columns=PARAMS)
+    for k, metric in enumerate(METRICS):
+        results[metric] = out[:, k]
+    results['n_bets'] = results['n_bets'].astype(np.int64)
+    staked = results['staked'].where(results['staked'] > 0)
+    results['roi'] = ((results['final_bankroll'] - bankroll) / staked).fillna(0.0)
+    return results.sort_values('final_bankroll', ascending=False, ignore_index=True)
+
+# ----------------------------
+# 4. Main Execution
+# ----------------------------
+
+if __name__ == "__main__":
+    model_data = get_model("model2.npz")
+
+    started = time.perf_counter()
+    races = load_history(["testRaceData.json"])
+    predictions = walk_forward_predictions(races, model_data['features'], model_data['lambda'])
+    replay = prepare_replay(predictions)
+    print(f"Out-of-sample predictions for {len(replay['race_offsets']) - 1} races "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    grid = parameter_grid(
+        min_edge=np.linspace(0.0, 0.5, 11),
+        max_edge=[0.3, 0.5, 1.0, 100.0],
+        min_odds=[1.0, 2.0, 3.0],
+        max_odds=[7.0, 15.0, 100.0],
+        min_prob=[0.0, 0.05, 0.1, 0.15],
+        max_stake=[0.02, 0.05, 0.1]
+    )
+    started = time.perf_counter()
+    results = sweep(replay, grid)
+    print(f"Swept {len(grid)} configurations in {time.perf_counter() - started:.2f}s")
+    print(results.head(10).to_string(index=False))
+
+    best = results.iloc[0][list(PARAMS)].to_dict()
+    summary, path = replay_bankroll(replay, **best)
+    print(f"\nBest configuration: {best}")
+    print(f"Final bankroll {summary['final_bankroll']:.2f} from {summary['n_bets']} bets, "
+          f"ROI {summary['roi']:.1%}, max drawdown {summary['max_drawdown']:.1%}")
@@ -0,0 +1,208 @@
+import os
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from racePrediction import card_slots, predict_card_outcomes
+from modelRegistry import get_model
+
+# ----------------------------
+# 1. Per-runner Bet Columns
+# ----------------------------
+
+# Output columns and the decimals they are rounded to
+ROUNDING = {
+    'edge_pct': 1,
+    'decimal_odds': 2,
+    'min_odds_top2': 2,
+    'min_odds_top3': 2,
+    'min_odds_top2_more_profitable': 2,
+    'min_odds_top3_more_profitable': 2,
+    'recommended_stake': 2,
+}
+
+def build_bet_table(runners, bankroll=100.0, max_stake=0.05, max_real_stake=50, race_col='race_id'):
+    """Add odds, edge, Kelly and stake columns for every runner on the card at once
+
+    Expects logOdds and the model_prob_* columns from predict_card_outcomes.
+    Rows come back grouped by race (stable within a race) with a field_size column.
+    """
+    table = runners.sort_values(race_col, kind='mergesort')
+    races = table.groupby(race_col, sort=False)
+
+    p_win = table['model_prob_win']
+    decimal_odds = np.exp(table['logOdds']) + 1
+    market_prob = 1 / decimal_odds
+    market_share = market_prob / market_prob.groupby(table[race_col], sort=False).transform('sum')
+
+    edge = p_win * decimal_odds - 1
+    kelly_fraction = edge / (decimal_odds - 1)
+    stake_fraction = kelly_fraction.clip(0, max_stake)
+
+    return table.assign(
+        field_size=races[race_col].transform('size'),
+        decimal_odds=decimal_odds,
+        market_share=market_share,
+        edge=edge,
+        edge_pct=edge * 100,
+        market_edge=p_win / market_share - 1,
+        kelly_fraction=kelly_fraction,
+        stake_fraction=stake_fraction,
+        recommended_stake=np.minimum(stake_fraction * bankroll, max_real_stake),
+        min_odds_top2=1 / table['model_prob_top2'],
+        min_odds_top3=1 / table['model_prob_top3'],
+        # Place odds at which a top-2/top-3 bet returns as much as the win bet
+        min_odds_top2_more_profitable=(decimal_odds - 1) * p_win / table['model_prob_top2'] + 1,
+        min_odds_top3_more_profitable=(decimal_odds - 1) * p_win / table['model_prob_top3'] + 1,
+    )
+
+# ----------------------------
+# 2. Filtering and Output
+# ----------------------------
+
+def value_bet_mask(table, min_edge=0.1, max_edge=0.3, min_odds=1.0, max_odds=7.0, min_prob=0,
+                   edge_col='edge'):
+    """Boolean mask of runners inside the edge, odds and probability windows"""
+    return (
+        (table['field_size'] >= 2) &
+        table[edge_col].between(min_edge, max_edge) &
+        table['decimal_odds'].between(min_odds, max_odds) &
+        (table['model_prob_win'] > min_prob)
+    )
+
+def format_recommendations(bets, columns):
+    """Select output columns and round them for the bets CSV"""
+    out = bets[columns].reset_index(drop=True)
+    for col, decimals in ROUNDING.items():
+        if col in out:
+            out[col] = out[col].round(decimals)
+    return out
+
+# ----------------------------
+# 2b. Simultaneous Kelly Staking
+# ----------------------------
+
+def simultaneous_kelly(race_ids, p_win, decimal_odds):
+    """Growth-optimal bankroll fractions for win bets on several runners of one race
+
+    Runners are ranked by expected return p*o within each race and added while
+    p*o exceeds the reserve rate R = (1 - sum p) / (1 - sum 1/o) of the runners
+    already taken; each taken runner gets p - R/o (Smoczynski & Tomkins). All
+    races are solved together on a padded (races, max_field) array. A lone
+    runner gets the usual single-bet Kelly fraction.
+    """
+    codes, _ = pd.factorize(np.asarray(race_ids))
+    p = np.asarray(p_win, dtype=float)
+    inv_odds = 1 / np.asarray(decimal_odds, dtype=float)
+    expected = p / inv_odds
+    if len(codes) == 0:
+        return np.zeros(0)
+
+    # Slot runners by descending expected return within their race
+    slots, field_sizes = card_slots(codes, sort_key=-expected)
+
+    shape = (len(field_sizes), field_sizes.max())
+    P = np.zeros(shape)
+    INV = np.zeros(shape)
+    EV = np.full(shape, -np.inf)
+    P[codes, slots] = p
+    INV[codes, slots] = inv_odds
+    EV[codes, slots] = expected
+
+    # Reserve rate with the first k runners taken, k = 0..max_field
+    numer = 1 - np.cumsum(np.pad(P, ((0, 0), (1, 0))), axis=1)
+    denom = 1 - np.cumsum(np.pad(INV, ((0, 0), (1, 0))), axis=1)
+    reserve = np.full(numer.shape, np.inf)
+    np.divide(numer, denom, out=reserve, where=denom > 0)
+
+    # Take the longest prefix whose runners each beat the reserve rate before them
+    take = np.cumprod(EV > reserve[:, :-1], axis=1).astype(bool)
+    final_reserve = reserve[np.arange(shape[0]), take.sum(axis=1)]
+    fractions = np.where(take, P - final_reserve[:, None] * INV, 0.0)
+    return fractions[codes, slots]
+
+def portfolio_stakes(bets, bankroll, max_stake=0.05, max_real_stake=50, race_col='race_id'):
+    """Re-stake already filtered bets with simultaneous Kelly per race
+
+    max_stake caps each race's total fraction (the race's bets are scaled
+    down together), and each stake is still capped at max_real_stake.
+    """
+    fractions = pd.Series(
+        simultaneous_kelly(bets[race_col], bets['model_prob_win'], bets['decimal_odds']),
+        index=bets.index
+    )
+    race_total = fractions.groupby(bets[race_col]).transform('sum')
+    fractions = fractions * np.minimum(1, max_stake / race_total.where(race_total > 0, 1))
+    return bets.assign(
+        stake_fraction=fractions,
+        recommended_stake=np.minimum(fractions * bankroll, max_real_stake)
+    )
+
+def cap_exposure(bets, bankroll, max_exposure=None):
+    """Scale every stake down together so the day's total stays within max_exposure * bankroll"""
+    total = bets['recommended_stake'].sum()
+    if max_exposure is None or total <= max_exposure * bankroll:
+        return bets
+    scale = max_exposure * bankroll / total
+    return bets.assign(
+        stake_fraction=bets['stake_fraction'] * scale,
+        recommended_stake=bets['recommended_stake'] * scale
+    )
+
+# ----------------------------
+# 3. Prediction Cache
+# ----------------------------
+
+PREDICTION_CACHE_SIZE = 4
+
+_PREDICTIONS = {}
+_DIGESTS = {}
+_CACHE_LOCK = threading.Lock()
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's bytes, rehashed only when its mtime or size changes"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _DIGESTS.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    _DIGESTS[path] = (stamp, h.hexdigest())
+    return _DIGESTS[path][1]
+
+def predicted_card(input_file, model_path, load_runners):
+    """Runners from load_runners(input_file, features) joined with model probabilities
+
+    The table is cached by loader and by the content hashes of the data and model
+    files, so repeated calls only pay for filtering. Treat it as read-only.
+    """
+    key = (load_runners.__module__, load_runners.__qualname__,
+           file_digest(input_file), file_digest(model_path))
+    with _CACHE_LOCK:
+        if key in _PREDICTIONS:
+            return _PREDICTIONS[key]
+
+        model_data = get_model(model_path)
+        runners = load_runners(input_file, model_data['features'])
+        table = runners.join(predict_card_outcomes(
+            runners,
+            beta_hat=model_data['beta_hat'],
+            scaler=model_data['scaler'],
+            features=model_data['features']
+        ))
+
+        # Keep only the most recent cards (oldest inserted first)
+        while len(_PREDICTIONS) >= PREDICTION_CACHE_SIZE:
+            del _PREDICTIONS[next(iter(_PREDICTIONS))]
+        _PREDICTIONS[key] = table
+        return table
+
+def clear_prediction_cache():
+    with _CACHE_LOCK:
+        _PREDICTIONS.clear()
+        _DIGESTS.clear()
@@ -0,0 +1,239 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+
+# ----------------------------
+# 1. Cache Policy
+# ----------------------------
+
+# Freshness lifetime (seconds) by URL class, first matching pattern wins
+URL_CLASSES = (
+    ('horse_profile', re.compile(r'/racing/form-profiles/horse/'), 7 * 24 * 3600),
+    ('jockey_profile', re.compile(r'/racing/form-profiles/jockey/'), 24 * 3600),
+    ('racecard', re.compile(r'/racing/racecards/'), 15 * 60),
+    ('meeting_index', re.compile(r'/racing/results/\d{2}-\d{2}-\d{4}$'), 5 * 60),
+    ('race_page', re.compile(r'/racing/'), 15 * 60),
+)
+DEFAULT_TTL = 10 * 60
+
+def url_class(url):
+    """(class name, ttl seconds) for a URL"""
+    for name, pattern, ttl in URL_CLASSES:
+        if pattern.search(url):
+            return name, ttl
+    return 'other', DEFAULT_TTL
+
+# ----------------------------
+# 2. Disk Cache
+# ----------------------------
+
+class HttpCache:
+    """Content-addressed on-disk cache of page bodies with an LRU size bound
+
+    Bodies live in bodies/<sha256> (pages with identical content are stored
+    once); index.json maps each URL to its body hash, validators (ETag,
+    Last-Modified) and fetch/access times. Call save() to persist the index.
+    """
+
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.body_dir = os.path.join(cache_dir, 'bodies')
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        try:
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.index = {}
+        self.body_sizes = {}
+        for entry in self.index.values():
+            self.body_sizes[entry['hash']] = entry['size']
+        self.stats = {}
+
+    def _count(self, url, outcome):
+        key = (url_class(url)[0], outcome)
+        self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _body_path(self, digest):
+        return os.path.join(self.body_dir, digest)
+
+    def _read(self, url):
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        try:
+            with open(self._body_path(entry['hash']), 'r', encoding='utf-8') as f:
+                body = f.read()
+        except FileNotFoundError:
+            del self.index[url]
+            return None
+        entry['accessed'] = time.time()
+        return body
+
+    def fresh(self, url):
+        """Cached body if it is still within its URL class TTL, else None"""
+        entry = self.index.get(url)
+        if entry is None or time.time() - entry['fetched'] > url_class(url)[1]:
+            return None
+        body = self._read(url)
+        if body is not None:
+            self._count(url, 'hit')
+        return body
+
+    def stale(self, url):
+        """Cached body regardless of age (for serving when the network fails)"""
+        body = self._read(url)
+        if body is not None:
+            self._count(url, 'stale')
+        return body
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since headers for revalidating an expired entry"""
+        entry = self.index.get(url)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def revalidated(self, url):
+        """Body for a 304 Not Modified response; restarts the entry's TTL"""
+        body = self._read(url)
+        if body is not None:
+            self.index[url]['fetched'] = time.time()
+            self._count(url, 'revalidated')
+        return body
+
+    def store(self, url, body, headers):
+        """Cache a freshly downloaded body with its validators"""
+        data = body.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self.body_sizes:
+            os.makedirs(self.body_dir, exist_ok=True)
+            with open(self._body_path(digest), 'wb') as f:
+                f.write(data)
+            self.body_sizes[digest] = len(data)
+
+        old = self.index.get(url)
+        now = time.time()
+        self.index[url] = {
+            'hash': digest,
+            'size': len(data),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched': now,
+            'accessed': now,
+        }
+        if old is not None and old['hash'] != digest:
+            self._release(old['hash'])
+        self._count(url, 'miss')
+        self._evict()
+
+    def _release(self, digest):
+        """Delete a body once no URL refers to it"""
+        if any(entry['hash'] == digest for entry in self.index.values()):
+            return
+        self.body_sizes.pop(digest, None)
+        try:
+            os.remove(self._body_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """Drop least recently used URLs until the stored bodies fit in max_bytes"""
+        total = sum(self.body_sizes.values())
+        if total <= self.max_bytes:
+            return
+        refs = {}
+        for entry in self.index.values():
+            refs[entry['hash']] = refs.get(entry['hash'], 0) + 1
+        for url in sorted(self.index, key=lambda u: self.index[u]['accessed']):
+            if total <= self.max_bytes:
+                break
+            digest = self.index.pop(url)['hash']
+            refs[digest] -= 1
+            if refs[digest] == 0:
+                total -= self.body_sizes.pop(digest, 0)
+                try:
+                    os.remove(self._body_path(digest))
+                except FileNotFoundError:
+                    pass
+
+    def reset_stats(self):
+        self.stats = {}
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def report(self):
+        """Per URL class counts of hits, revalidations, misses and stale fallbacks"""
+        classes = sorted({name for name, _ in self.stats})
+        outcomes = ('hit', 'revalidated', 'miss', 'stale')
+        return {name: {o: self.stats.get((name, o), 0) for o in outcomes} for name in classes}
+
+    def print_report(self):
+        report = self.report()
+        print("\nHTTP cache:")
+        for name, counts in report.items():
+            requests = sum(counts.values())
+            local = counts['hit'] + counts['revalidated'] + counts['stale']
+            print(f"  {name:<16} {requests:6d} requests  {counts['hit']:6d} hits  "
+                  f"{counts['revalidated']:6d} revalidated  {counts['miss']:6d} downloaded  "
+                  f"({local / requests:.0%} local)")
+        print(f"  {len(self.index)} pages, {sum(self.body_sizes.values()) / 1e6:.1f} MB on disk")
+
+# One cache object per directory, shared by every scraper in the process
+_CACHES = {}
+
+def open_cache(cache_dir=".http_cache", max_bytes=200 * 1024 * 1024):
+    cache_dir = os.path.abspath(cache_dir)
+    if cache_dir not in _CACHES:
+        _CACHES[cache_dir] = HttpCache(cache_dir, max_bytes)
+    return _CACHES[cache_dir]
+
+# ----------------------------
+# 3. In-flight Request Coalescing
+# ----------------------------
+
+class SingleFlight:
+    """At most one pending task per key; concurrent callers with the same key share its result
+
+    Counts, per key kind (the first element of tuple keys), how many calls were
+    served by joining a task already in flight instead of starting a new one.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.coalesced = {}
+
+    async def run(self, key, make_coro):
+        """Await make_coro() for key, or the already running task for key"""
+        task = self.pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_coro())
+            self.pending[key] = task
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+        else:
+            kind = key[0] if isinstance(key, tuple) else 'request'
+            self.coalesced[kind] = self.coalesced.get(kind, 0) + 1
+        # Shielded so one cancelled caller does not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def reset(self):
+        self.pending = {}
+        self.coalesced = {}
+
+    def print_report(self):
+        total = sum(self.coalesced.values())
+        detail = ", ".join(f"{kind}: {n}" for kind, n in sorted(self.coalesced.items()))
+        print(f"Coalesced {total} duplicate in-flight requests" + (f" ({detail})" if detail else ""))
@@ -1,15 +1,31 @@
 import numpy as np
 import pandas as pd
-from scipy.optimize import minimize
+from scipy.optimize import minimize, OptimizeResult
 from scipy.special import logsumexp
 import json
+import os
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import KFold
 import pickle
+import copy
 import math
-from numba import njit
+import time
+from numba import njit, prange, set_num_threads, config
 from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
 from collections import defaultdict
+from contextlib import contextmanager
+from modelRegistry import save_model_artifact
+from racePrediction import exact_top_probabilities, simulate_rank_probabilities
+
+# Likelihood threads: CV already runs one process per task, so keep it serial there
+CV_THREADS = 1
+FIT_THREADS = config.NUMBA_NUM_THREADS
+
+# Coefficient solver: 'newton' (exact Hessian, standard errors) or 'lbfgs'
+SOLVER = 'newton'
+
+# Rows per race-aligned chunk when streaming a memory-mapped training store
+STORE_CHUNK_ROWS = 1_000_000
 
 # ----------------------------
 # 1. Optimized Data Preparation
@@ -20,35 +36,167 @@ def load_and_preprocess_data(filepath, features):
     with open(filepath, "r") as f:
         data = json.load(f)
     
-    df = pd.DataFrame(data)
+    valid_races, race_ids = clean_and_index_races(pd.DataFrame(data))
+    
+    # Standardize features
+    scaler = StandardScaler()
+    valid_races[features] = scaler.fit_transform(valid_races[features])
     
+    # Sort once by (race, rank) so every race and tie group is a contiguous slice
+    valid_races = valid_races.sort_values(['race_idx', 'rank'], kind='stable').reset_index(drop=True)
+    segments = build_race_segments(valid_races['race_idx'].values, valid_races['rank'].values)
+    
+    return valid_races, scaler, race_ids, segments
+
+def clean_and_index_races(df):
+    """Clean race ids, keep races with complete rankings and number them in file order
+    
+    A race is kept when its ranks are exactly 1..field size. Validation is done
+    with one sort over (race, rank) and a summary of dropped races is printed.
+    """
     # Clean race_id
     df['race_id'] = df['race_id'].astype(str).str.replace('\n', ' ').str.strip()
     
+    # Per-race size, distinct ranks, min and max from a single (race, rank) sort
+    codes, uniques = pd.factorize(df['race_id'])
+    ranks = df['rank'].values
+    order = np.lexsort((ranks, codes))
+    sorted_codes = codes[order]
+    sorted_ranks = ranks[order]
+    
+    starts = np.ones(len(order), dtype=bool)
+    starts[1:] = sorted_codes[1:] != sorted_codes[:-1]
+    distinct = starts.copy()
+    distinct[1:] |= sorted_ranks[1:] != sorted_ranks[:-1]
+    
+    n_races = len(uniques)
+    size = np.bincount(codes, minlength=n_races)
+    n_distinct = np.bincount(sorted_codes[distinct], minlength=n_races)
+    first = np.flatnonzero(starts)
+    last = np.append(first[1:], len(order)) - 1
+    min_rank = np.zeros(n_races)
+    max_rank = np.zeros(n_races)
+    min_rank[sorted_codes[first]] = sorted_ranks[first]
+    max_rank[sorted_codes[first]] = sorted_ranks[last]
+    
     # Validate complete ranking sequences
-    valid_races = df.groupby('race_id').filter(lambda g: 
-        (g['rank'].nunique() == len(g)) and 
-        (g['rank'].min() == 1) and 
-        (g['rank'].max() == len(g))
-    )
+    duplicate = n_distinct != size
+    bad_start = ~duplicate & (min_rank != 1)
+    gap = ~duplicate & ~bad_start & (max_rank != size)
+    valid = ~(duplicate | bad_start | gap)
     
-    # Create race indices
-    race_ids = valid_races['race_id'].unique()
-    valid_races['race_idx'] = valid_races['race_id'].map(
-        {rid: i for i, rid in enumerate(race_ids)}
-    )
+    n_dropped = n_races - valid.sum()
+    if n_dropped:
+        print(f"Dropped {n_dropped} of {n_races} races: {duplicate.sum()} with tied/duplicate ranks, "
+              f"{bad_start.sum()} not starting at rank 1, {gap.sum()} with gaps in the ranking")
     
-    # Standardize features
-    scaler = StandardScaler()
-    valid_races[features] = scaler.fit_transform(valid_races[features])
+    # Create race indices (valid races renumbered in order of first appearance)
+    race_idx = np.cumsum(valid) - 1
+    row_mask = valid[codes]
+    valid_races = df.loc[row_mask].copy()
+    valid_races['race_idx'] = race_idx[codes[row_mask]]
+    race_ids = uniques[valid]
+    return valid_races, race_ids
+
+def build_race_segments(race_indices, ranks):
+    """CSR-style race and tie-group offsets for rows sorted by (race_idx, rank)"""
+    n = len(race_indices)
+    new_race = np.ones(n, dtype=bool)
+    new_race[1:] = race_indices[1:] != race_indices[:-1]
+    new_group = new_race.copy()
+    new_group[1:] |= ranks[1:] != ranks[:-1]
     
-    return valid_races, scaler, race_ids
+    race_offsets = np.append(np.flatnonzero(new_race), n).astype(np.int64)
+    group_offsets = np.append(np.flatnonzero(new_group), n).astype(np.int64)
+    return race_offsets, group_offsets
+
+# ----------------------------
+# 1b. Out-of-core Training Store
+# ----------------------------
+
+# On-disk column layout: name -> (dtype, columns per row or None for 1-D)
+STORE_COLUMNS = {'X': np.float32, 'race_idx': np.int32, 'rank': np.int16}
+
+def build_training_store(filepaths, store_dir, features):
+    """Convert one or more history files into a compact memory-mapped store
+    
+    Files are processed one at a time (each race must sit within one file), so
+    peak memory is a single file rather than the whole history. Rows are written
+    sorted by (race, rank) as float32 features, int32 race index and int16 rank,
+    then standardized in place chunk by chunk with the running mean/std.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    paths = {name: os.path.join(store_dir, f"{name}.bin") for name in STORE_COLUMNS}
+    for path in paths.values():
+        open(path, 'wb').close()
+    
+    n_rows = 0
+    race_ids = []
+    total = np.zeros(len(features))
+    total_sq = np.zeros(len(features))
+    for filepath in filepaths:
+        with open(filepath, "r") as f:
+            valid_races, file_race_ids = clean_and_index_races(pd.DataFrame(json.load(f)))
+        valid_races = valid_races.sort_values(['race_idx', 'rank'], kind='stable')
+        
+        values = valid_races[features].values.astype(np.float64)
+        total += values.sum(axis=0)
+        total_sq += (values ** 2).sum(axis=0)
+        
+        with open(paths['X'], 'ab') as f:
+            values.astype(np.float32).tofile(f)
+        with open(paths['race_idx'], 'ab') as f:
+            (valid_races['race_idx'].values + len(race_ids)).astype(np.int32).tofile(f)
+        with open(paths['rank'], 'ab') as f:
+            valid_races['rank'].values.astype(np.int16).tofile(f)
+        
+        n_rows += len(valid_races)
+        race_ids.extend(str(rid) for rid in file_race_ids)
+    
+    # Population statistics, matching StandardScaler
+    mean = total / max(n_rows, 1)
+    scale = np.sqrt(np.maximum(total_sq / max(n_rows, 1) - mean ** 2, 0.0))
+    scale[scale == 0] = 1.0
+    
+    meta = {'features': list(features), 'n_rows': n_rows, 'mean': mean.tolist(),
+            'scale': scale.tolist(), 'race_ids': race_ids}
+    with open(os.path.join(store_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    
+    store = open_training_store(store_dir, mode='r+')
+    for start in range(0, n_rows, STORE_CHUNK_ROWS):
+        chunk = store['X'][start:start + STORE_CHUNK_ROWS]
+        chunk[...] = (chunk - mean) / scale
+    store['X'].flush()
+    
+    race_offsets, group_offsets = build_race_segments(store['race_idx'], store['rank'])
+    np.save(os.path.join(store_dir, 'race_offsets.npy'), race_offsets)
+    np.save(os.path.join(store_dir, 'group_offsets.npy'), group_offsets)
+    return open_training_store(store_dir)
+
+def open_training_store(store_dir, mode='r'):
+    """Memory-map a store written by build_training_store"""
+    with open(os.path.join(store_dir, 'meta.json'), "r") as f:
+        meta = json.load(f)
+    
+    n_rows = meta['n_rows']
+    store = {'meta': meta}
+    for name, dtype in STORE_COLUMNS.items():
+        shape = (n_rows, len(meta['features'])) if name == 'X' else (n_rows,)
+        store[name] = np.memmap(os.path.join(store_dir, f"{name}.bin"), dtype=dtype, mode=mode, shape=shape) \
+            if n_rows else np.zeros(shape, dtype=dtype)
+    
+    for name in ('race_offsets', 'group_offsets'):
+        path = os.path.join(store_dir, f"{name}.npy")
+        if os.path.exists(path):
+            store[name] = np.load(path, mmap_mode='r')
+    return store
 
 # ----------------------------
 # 2. Numba-accelerated Likelihood
 # ----------------------------
 
-@njit
+@njit(cache=True)
 def fast_log_likelihood(beta, X, race_indices, ranks, lambda_reg):
     """Numba-optimized likelihood calculation"""
     ll = 0.0
@@ -83,67 +231,833 @@ def fast_log_likelihood(beta, X, race_indices, ranks, lambda_reg):
     ll -= lambda_reg * np.sum(beta**2)
     return -ll
 
+@njit(cache=True)
+def _race_log_likelihood_and_grad(X, V, end, group_offsets, g, grad):
+    """Log-likelihood of one race starting at tie group g; accumulates into grad"""
+    ll = 0.0
+    n_features = X.shape[1]
+    
+    while g < len(group_offsets) - 1 and group_offsets[g] < end:
+        k = group_offsets[g]
+        group_end = group_offsets[g + 1]
+        
+        max_rem = V[k]
+        for j in range(k + 1, end):
+            max_rem = max(max_rem, V[j])
+        
+        s_group = 0.0
+        s_rem = 0.0
+        for j in range(k, end):
+            w = math.exp(V[j] - max_rem)
+            s_rem += w
+            if j < group_end:
+                s_group += w
+        ll += math.log(s_group) - math.log(s_rem)
+        
+        # Softmax-weighted feature means of the group and the remaining field
+        for j in range(k, end):
+            w = math.exp(V[j] - max_rem)
+            coef = -w / s_rem
+            if j < group_end:
+                coef += w / s_group
+            for f in range(n_features):
+                grad[f] += coef * X[j, f]
+        
+        if group_end - k > 1:
+            ll -= math.lgamma(group_end - k + 1)
+        
+        g += 1
+    
+    return ll
+
+@njit(cache=True)
+def segment_log_likelihood_and_grad(beta, X, race_offsets, group_offsets, lambda_reg):
+    """Likelihood and gradient walking contiguous race/tie-group slices"""
+    ll = 0.0
+    n_features = len(beta)
+    grad = np.zeros(n_features)
+    V = np.empty(X.shape[0])
+    for j in range(X.shape[0]):
+        v = 0.0
+        for f in range(n_features):
+            v += X[j, f] * beta[f]
+        V[j] = v
+    
+    race_groups = np.searchsorted(group_offsets, race_offsets)
+    for r in range(len(race_offsets) - 1):
+        ll += _race_log_likelihood_and_grad(X, V, race_offsets[r + 1], group_offsets, race_groups[r], grad)
+    
+    # Regularization (exclude reference feature)
+    ll -= lambda_reg * np.sum(beta**2)
+    grad -= 2.0 * lambda_reg * beta
+    return -ll, -grad
+
+@njit(parallel=True, cache=True)
+def parallel_segment_log_likelihood_and_grad(beta, X, race_offsets, group_offsets, lambda_reg):
+    """Multi-threaded variant: per-race terms are computed with prange, then reduced"""
+    n_features = len(beta)
+    n_races = len(race_offsets) - 1
+    V = np.empty(X.shape[0])
+    for j in prange(X.shape[0]):
+        v = 0.0
+        for f in range(n_features):
+            v += X[j, f] * beta[f]
+        V[j] = v
+    
+    race_groups = np.searchsorted(group_offsets, race_offsets)
+    race_ll = np.zeros(n_races)
+    race_grad = np.zeros((n_races, n_features))
+    for r in prange(n_races):
+        race_ll[r] = _race_log_likelihood_and_grad(X, V, race_offsets[r + 1], group_offsets, race_groups[r], race_grad[r])
+    
+    ll = np.sum(race_ll)
+    grad = np.zeros(n_features)
+    for r in range(n_races):
+        grad += race_grad[r]
+    
+    # Regularization (exclude reference feature)
+    ll -= lambda_reg * np.sum(beta**2)
+    grad -= 2.0 * lambda_reg * beta
+    return -ll, -grad
+
+@njit(cache=True)
+def _race_grad_hess(X, V, end, group_offsets, g, grad, hess):
+    """Like _race_log_likelihood_and_grad, also accumulating the log-likelihood Hessian"""
+    ll = 0.0
+    n_features = X.shape[1]
+    mu_group = np.empty(n_features)
+    mu_rem = np.empty(n_features)
+    
+    while g < len(group_offsets) - 1 and group_offsets[g] < end:
+        k = group_offsets[g]
+        group_end = group_offsets[g + 1]
+        
+        max_rem = V[k]
+        for j in range(k + 1, end):
+            max_rem = max(max_rem, V[j])
+        
+        s_group = 0.0
+        s_rem = 0.0
+        for j in range(k, end):
+            w = math.exp(V[j] - max_rem)
+            s_rem += w
+            if j < group_end:
+                s_group += w
+        ll += math.log(s_group) - math.log(s_rem)
+        
+        # Hessian of log-sum-exp is the softmax covariance of the features
+        mu_group[:] = 0.0
+        mu_rem[:] = 0.0
+        for j in range(k, end):
+            w = math.exp(V[j] - max_rem)
+            p_rem = w / s_rem
+            coef = -p_rem
+            if j < group_end:
+                coef += w / s_group
+            for f in range(n_features):
+                grad[f] += coef * X[j, f]
+                mu_rem[f] += p_rem * X[j, f]
+                if j < group_end:
+                    mu_group[f] += (w / s_group) * X[j, f]
+                for h in range(f + 1):
+                    hess[f, h] += coef * X[j, f] * X[j, h]
+        for f in range(n_features):
+            for h in range(f + 1):
+                hess[f, h] += mu_rem[f] * mu_rem[h] - mu_group[f] * mu_group[h]
+        
+        if group_end - k > 1:
+            ll -= math.lgamma(group_end - k + 1)
+        
+        g += 1
+    
+    return ll
+
+@njit(cache=True)
+def _finish_grad_hess(ll, grad, hess, beta, lambda_reg):
+    """Mirror the lower triangle, add the L2 penalty and negate"""
+    n_features = len(beta)
+    for f in range(n_features):
+        for h in range(f):
+            hess[h, f] = hess[f, h]
+    ll -= lambda_reg * np.sum(beta**2)
+    grad -= 2.0 * lambda_reg * beta
+    for f in range(n_features):
+        hess[f, f] -= 2.0 * lambda_reg
+    return -ll, -grad, -hess
+
+@njit(cache=True)
+def segment_log_likelihood_grad_hess(beta, X, race_offsets, group_offsets, lambda_reg):
+    """Negative log-likelihood, gradient and Hessian in one pass over the race segments"""
+    ll = 0.0
+    n_features = len(beta)
+    grad = np.zeros(n_features)
+    hess = np.zeros((n_features, n_features))
+    V = np.empty(X.shape[0])
+    for j in range(X.shape[0]):
+        v = 0.0
+        for f in range(n_features):
+            v += X[j, f] * beta[f]
+        V[j] = v
+    
+    race_groups = np.searchsorted(group_offsets, race_offsets)
+    for r in range(len(race_offsets) - 1):
+        ll += _race_grad_hess(X, V, race_offsets[r + 1], group_offsets, race_groups[r], grad, hess)
+    
+    return _finish_grad_hess(ll, grad, hess, beta, lambda_reg)
+
+@njit(parallel=True, cache=True)
+def parallel_segment_log_likelihood_grad_hess(beta, X, race_offsets, group_offsets, lambda_reg):
+    """Multi-threaded variant of segment_log_likelihood_grad_hess"""
+    n_features = len(beta)
+    n_races = len(race_offsets) - 1
+    V = np.empty(X.shape[0])
+    for j in prange(X.shape[0]):
+        v = 0.0
+        for f in range(n_features):
+            v += X[j, f] * beta[f]
+        V[j] = v
+    
+    race_groups = np.searchsorted(group_offsets, race_offsets)
+    race_ll = np.zeros(n_races)
+    race_grad = np.zeros((n_races, n_features))
+    race_hess = np.zeros((n_races, n_features, n_features))
+    for r in prange(n_races):
+        race_ll[r] = _race_grad_hess(X, V, race_offsets[r + 1], group_offsets, race_groups[r],
+                                     race_grad[r], race_hess[r])
+    
+    grad = np.zeros(n_features)
+    hess = np.zeros((n_features, n_features))
+    for r in range(n_races):
+        grad += race_grad[r]
+        hess += race_hess[r]
+    
+    return _finish_grad_hess(np.sum(race_ll), grad, hess, beta, lambda_reg)
+
+def select_likelihood(n_threads=1, hessian=False):
+    """Serial kernel for a single thread, otherwise the prange kernel with a capped pool"""
+    if n_threads <= 1:
+        return segment_log_likelihood_grad_hess if hessian else segment_log_likelihood_and_grad
+    set_num_threads(min(n_threads, config.NUMBA_NUM_THREADS))
+    return parallel_segment_log_likelihood_grad_hess if hessian else parallel_segment_log_likelihood_and_grad
+
+# ----------------------------
+# 2b. Kernel Warm-up
+# ----------------------------
+
+# Declared signatures of the kernels the solvers call; warm_up compiles (or loads
+# from the on-disk cache) exactly these. Arrays are C-contiguous, as kernel_arrays
+# makes them: numba compiles a separate version for every layout it is given.
+KERNEL_ARGS = '(float64[::1], float64[:, ::1], int64[::1], int64[::1], float64)'
+LIKELIHOOD_GRAD_SIG = 'Tuple((float64, float64[::1]))' + KERNEL_ARGS
+LIKELIHOOD_HESS_SIG = 'Tuple((float64, float64[::1], float64[:, ::1]))' + KERNEL_ARGS
+KERNEL_SIGNATURES = (
+    (segment_log_likelihood_and_grad, LIKELIHOOD_GRAD_SIG),
+    (parallel_segment_log_likelihood_and_grad, LIKELIHOOD_GRAD_SIG),
+    (segment_log_likelihood_grad_hess, LIKELIHOOD_HESS_SIG),
+    (parallel_segment_log_likelihood_grad_hess, LIKELIHOOD_HESS_SIG),
+)
+
+def warm_up(verbose=True):
+    """Compile every kernel for its declared signature before the first real call
+    
+    Compiled code is cached next to this file, so later processes only load it.
+    Calls with other dtypes or layouts still work but compile a new
+    specialization; pass inputs through kernel_arrays and lambda as a float.
+    Returns {kernel: (seconds, 'cache' or 'compiled')}.
+    """
+    report = {}
+    for kernel, sig in KERNEL_SIGNATURES:
+        hits = sum(kernel.stats.cache_hits.values())
+        started = time.perf_counter()
+        kernel.compile(sig)
+        source = 'cache' if sum(kernel.stats.cache_hits.values()) > hits else 'compiled'
+        report[kernel.__name__] = (time.perf_counter() - started, source)
+    
+    if verbose:
+        print_startup_report(report)
+    return report
+
+def kernel_arrays(X, segments):
+    """X and the (race, group) offsets as the C-contiguous float64/int64 arrays of the warmed-up signatures"""
+    return (np.ascontiguousarray(X, dtype=np.float64),
+            tuple(np.ascontiguousarray(offsets, dtype=np.int64) for offsets in segments))
+
+def print_startup_report(report):
+    """Print per-kernel warm-up times and whether each came from the disk cache"""
+    print("\nKernel startup:")
+    for name, (seconds, source) in report.items():
+        print(f"  {name:<42} {seconds:7.3f}s  ({source})")
+    print(f"  {'total':<42} {sum(seconds for seconds, _ in report.values()):7.3f}s")
+
+# ----------------------------
+# 2c. Solvers
+# ----------------------------
+
+def newton_fit(X, segments, λ, beta0=None, n_threads=1, tol=1e-8, maxiter=25):
+    """Damped Newton fit using the exact Hessian
+    
+    Tie groups can make the Hessian indefinite, so it is shifted by a growing
+    multiple of the identity until it factorizes, and each step is backtracked
+    until it decreases the objective. The result carries coefficient standard
+    errors from the inverse Hessian at the solution.
+    """
+    kernel = select_likelihood(n_threads, hessian=True)
+    beta0 = np.zeros(X.shape[1]) if beta0 is None else beta0
+    return newton_minimize(lambda beta: kernel(beta, X, *segments, λ), beta0, tol, maxiter)
+
+def _all_finite(*values):
+    return all(np.all(np.isfinite(v)) for v in values)
+
+def _newton_result(beta, f, grad, hess, nit, success, message):
+    """OptimizeResult with standard errors from the inverse Hessian (NaN if it is not finite)"""
+    std_err = np.full(len(beta), np.nan)
+    if _all_finite(hess):
+        with np.errstate(invalid='ignore'):
+            std_err = np.sqrt(np.diag(np.linalg.pinv(hess)))
+    return OptimizeResult(x=beta, fun=f, jac=grad, hess=hess, std_err=std_err,
+                          nit=nit, success=success, message=message)
+
+def newton_minimize(objective, beta0, tol=1e-8, maxiter=25, max_shifts=60):
+    """Damped Newton iterations on objective(beta) -> (value, gradient, Hessian)
+    
+    A non-finite objective (e.g. NaN features) or a Hessian that no shift up to
+    max_shifts doublings makes positive definite ends the fit with success=False.
+    """
+    beta = np.array(beta0, dtype=float)
+    f, grad, hess = objective(beta)
+    message = 'Maximum number of iterations reached'
+    success = False
+    
+    if not _all_finite(f, grad, hess):
+        return _newton_result(beta, f, grad, hess, 0, False, 'Objective is not finite at the starting point')
+    
+    nit = 0
+    for nit in range(1, maxiter + 1):
+        if np.max(np.abs(grad)) < tol:
+            message, success = 'Gradient below tolerance', True
+            break
+        
+        shift = 0.0
+        L = None
+        for _ in range(max_shifts):
+            try:
+                L = np.linalg.cholesky(hess + shift * np.eye(len(beta)))
+                break
+            except np.linalg.LinAlgError:
+                shift = max(2 * shift, 1e-6 * np.abs(hess).max(initial=1.0))
+        if L is None:
+            message = 'Hessian could not be made positive definite'
+            break
+        step = np.linalg.solve(L.T, np.linalg.solve(L, grad))
+        
+        # Backtrack past non-finite values as well as insufficient decrease
+        t = 1.0
+        while t > 1e-10:
+            f_new, grad_new, hess_new = objective(beta - t * step)
+            if _all_finite(f_new, grad_new, hess_new) and f_new <= f - 1e-4 * t * grad @ step:
+                break
+            t /= 2
+        else:
+            message = 'Line search failed'
+            break
+        
+        converged = f - f_new < tol * max(1.0, abs(f))
+        beta, f, grad, hess = beta - t * step, f_new, grad_new, hess_new
+        if converged:
+            message, success = 'Objective change below tolerance', True
+            break
+    
+    return _newton_result(beta, f, grad, hess, nit, success, message)
+
+def fit_coefficients(X, segments, λ, beta0=None, n_threads=1, solver=None, maxiter=None):
+    """Fit beta with the configured solver ('newton' or 'lbfgs'); returns an OptimizeResult"""
+    solver = solver or SOLVER
+    X, segments = kernel_arrays(X, segments)
+    beta0 = np.zeros(X.shape[1]) if beta0 is None else beta0
+    if solver == 'newton':
+        return newton_fit(X, segments, λ, beta0, n_threads=n_threads, maxiter=maxiter or 25)
+    return minimize(
+        select_likelihood(n_threads),
+        beta0,
+        args=(X, *segments, λ),
+        jac=True,
+        method='L-BFGS-B',
+        options={'maxiter': maxiter or 100}
+    )
+
+def _store_chunks(store, chunk_rows):
+    """Yield (X, race_offsets, group_offsets) for race-aligned chunks of a store"""
+    race_offsets = store['race_offsets']
+    group_offsets = store['group_offsets']
+    r = 0
+    n_races = len(race_offsets) - 1
+    while r < n_races:
+        start = race_offsets[r]
+        r_end = max(np.searchsorted(race_offsets, start + chunk_rows, side='right') - 1, r + 1)
+        r_end = min(r_end, n_races)
+        end = race_offsets[r_end]
+        
+        g0, g1 = np.searchsorted(group_offsets, [start, end])
+        X, offsets = kernel_arrays(store['X'][start:end],
+                                   (race_offsets[r:r_end + 1] - start, group_offsets[g0:g1 + 1] - start))
+        yield (X, *offsets)
+        r = r_end
+
+def streamed_objective(store, λ, n_threads=1, hessian=False, chunk_rows=None):
+    """Objective over a memory-mapped store, evaluated one race-aligned chunk at a time
+    
+    Returns a function of beta giving (NLL, gradient) or, with hessian=True,
+    (NLL, gradient, Hessian); only one chunk is held in memory as float64.
+    """
+    kernel = select_likelihood(n_threads, hessian=hessian)
+    chunk_rows = chunk_rows or STORE_CHUNK_ROWS
+    
+    def objective(beta):
+        totals = None
+        for X, race_offsets, group_offsets in _store_chunks(store, chunk_rows):
+            parts = kernel(beta, X, race_offsets, group_offsets, 0.0)
+            totals = list(parts) if totals is None else [t + p for t, p in zip(totals, parts)]
+        
+        # L2 penalty once for the whole history
+        totals[0] += λ * np.sum(beta ** 2)
+        totals[1] = totals[1] + 2.0 * λ * beta
+        if hessian:
+            totals[2] = totals[2] + 2.0 * λ * np.eye(len(beta))
+        return tuple(totals)
+    
+    return objective
+
+def fit_store(store, λ, beta0=None, n_threads=FIT_THREADS, solver=None, maxiter=None, chunk_rows=None):
+    """fit_coefficients for a memory-mapped training store"""
+    solver = solver or SOLVER
+    beta0 = np.zeros(len(store['meta']['features'])) if beta0 is None else beta0
+    if solver == 'newton':
+        objective = streamed_objective(store, λ, n_threads, hessian=True, chunk_rows=chunk_rows)
+        return newton_minimize(objective, beta0, maxiter=maxiter or 25)
+    return minimize(
+        streamed_objective(store, λ, n_threads, chunk_rows=chunk_rows),
+        beta0,
+        jac=True,
+        method='L-BFGS-B',
+        options={'maxiter': maxiter or 100}
+    )
+
 # ----------------------------
 # 3. Parallel Cross-Validation
 # ----------------------------
 
+def fit_and_score_fold(X, race_indices, ranks, train_idx, val_idx, λ):
+    """Fit on the training rows and return the unpenalized validation NLL (None on failure)"""
+    # Training data
+    X_train = X[train_idx]
+    ri_train = race_indices[train_idx]
+    rk_train = ranks[train_idx]
+    
+    # Validation data
+    X_val = X[val_idx]
+    ri_val = race_indices[val_idx]
+    rk_val = ranks[val_idx]
+
+    # Rows arrive sorted by (race, rank), so fold subsets stay contiguous
+    seg_train = build_race_segments(ri_train, rk_train)
+    seg_val = build_race_segments(ri_val, rk_val)
+
+    # Optimize model
+    res = fit_coefficients(X_train, seg_train, λ, n_threads=CV_THREADS, maxiter=50 if SOLVER == 'lbfgs' else None)
+    
+    if res.success:
+        return segment_log_likelihood_and_grad(res.x, X_val, *seg_val, 0.0)[0]
+    return None
+
 def parallel_cv(args):
     """Parallel CV execution with error handling"""
     train_idx, val_idx, λ, X, race_indices, ranks, features = args
     try:
-        # Training data
-        X_train = X[train_idx]
-        ri_train = race_indices[train_idx]
-        rk_train = ranks[train_idx]
-        
-        # Validation data
-        X_val = X[val_idx]
-        ri_val = race_indices[val_idx]
-        rk_val = ranks[val_idx]
-
-        # Optimize model
-        res = minimize(
-            lambda p: fast_log_likelihood(p, X_train, ri_train, rk_train, λ),
-            np.zeros(len(features)),
-            method='L-BFGS-B',
-            options={'maxiter': 50, 'disp': False}
-        )
-        
-        if res.success:
-            score = fast_log_likelihood(res.x, X_val, ri_val, rk_val, 0)
+        score = fit_and_score_fold(X, race_indices, ranks, train_idx, val_idx, λ)
+        if score is not None:
             return (λ, score)
     except Exception as e:
         print(f"λ={λ} error: {str(e)}")
     return None
 
+# Worker-side views of the shared training arrays (populated by _attach_shared_cv_data)
+_SHARED_CV = {}
+
+def _share_array(arr):
+    """Copy an array into a new shared memory block; returns (block, spec)"""
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+def _attach_shared_cv_data(specs):
+    """ProcessPoolExecutor initializer: map the shared blocks into this worker"""
+    warm_up(verbose=False)
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _SHARED_CV[key + '_shm'] = shm  # keep the mapping alive
+        _SHARED_CV[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+def shared_cv_task(args):
+    """CV task that only receives (fold, λ); the data lives in shared memory"""
+    fold, λ = args
+    try:
+        train_idx, val_idx = _shared_fold_indices(fold)
+        score = fit_and_score_fold(
+            _SHARED_CV['X'], _SHARED_CV['race_indices'], _SHARED_CV['ranks'], train_idx, val_idx, λ
+        )
+        if score is not None:
+            return (λ, score)
+    except Exception as e:
+        print(f"λ={λ} fold={fold} error: {str(e)}")
+    return None
+
+def _fold_ids(n_rows, folds):
+    """Validation fold number per row (-1 for rows never validated)"""
+    fold_ids = np.full(n_rows, -1, dtype=np.int16)
+    for fold, (_, val_idx) in enumerate(folds):
+        fold_ids[val_idx] = fold
+    return fold_ids
+
+def _train_masks(n_rows, folds):
+    """(folds, rows) training membership, so train sets need not be the validation complement"""
+    masks = np.zeros((len(folds), n_rows), dtype=np.uint8)
+    for fold, (train_idx, _) in enumerate(folds):
+        masks[fold, train_idx] = 1
+    return masks
+
+def race_folds(race_indices, n_folds=3, walk_forward=False):
+    """CV folds made of whole, contiguous races
+    
+    Rows must be sorted by race_idx (as load_and_preprocess_data leaves them);
+    races are cut into blocks of roughly equal row counts in race_idx order.
+    With walk_forward=True the data is cut into n_folds + 1 blocks and fold k
+    trains on every block before block k + 1 and validates on it. Cut points
+    that land on the same race merge, so small or lumpy data can give fewer
+    than n_folds folds.
+    """
+    n_rows = len(race_indices)
+    new_race = np.ones(n_rows, dtype=bool)
+    new_race[1:] = race_indices[1:] != race_indices[:-1]
+    race_starts = np.flatnonzero(new_race)
+    
+    n_blocks = n_folds + 1 if walk_forward else n_folds
+    targets = np.linspace(0, n_rows, n_blocks + 1)[1:-1]
+    cuts = race_starts[np.minimum(np.searchsorted(race_starts, targets), len(race_starts) - 1)]
+    bounds = np.unique(np.concatenate(([0], cuts, [n_rows])))
+    
+    rows = np.arange(n_rows)
+    folds = []
+    for k in range(1 if walk_forward else 0, len(bounds) - 1):
+        val_idx = rows[bounds[k]:bounds[k + 1]]
+        train_idx = rows[:bounds[k]] if walk_forward else np.concatenate((rows[:bounds[k]], rows[bounds[k + 1]:]))
+        folds.append((train_idx, val_idx))
+    return folds
+
+@contextmanager
+def shared_cv_pool(X, race_indices, ranks, folds, max_workers=None):
+    """Process pool whose workers see X, race_indices, ranks and fold ids through shared memory"""
+    blocks = []
+    specs = {}
+    try:
+        arrays = (('X', X), ('race_indices', race_indices), ('ranks', ranks),
+                  ('fold_ids', _fold_ids(len(X), folds)), ('train_masks', _train_masks(len(X), folds)))
+        for key, arr in arrays:
+            shm, specs[key] = _share_array(arr)
+            blocks.append(shm)
+        
+        # Spawned (not forked) workers: a parent that has loaded the prange kernel
+        # owns numba's thread pool, which does not survive fork()
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context('spawn'),
+                                 initializer=_attach_shared_cv_data, initargs=(specs,)) as executor:
+            yield executor
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+def run_shared_cv(X, race_indices, ranks, folds, lambdas, max_workers=None):
+    """Cross-validate every (λ, fold) pair with the training data placed in shared memory once
+    
+    folds is a sequence of (train_idx, val_idx) pairs with disjoint validation
+    sets (as produced by race_folds). Returns the same (λ, score) results as
+    mapping parallel_cv.
+    """
+    tasks = [(fold, λ) for λ in lambdas for fold in range(len(folds))]
+    with shared_cv_pool(X, race_indices, ranks, folds, max_workers) as executor:
+        return list(executor.map(shared_cv_task, tasks))
+
+# ----------------------------
+# 3b. Regularization Path Search
+# ----------------------------
+
+def _fit_warm(X_train, seg_train, λ, beta0, maxiter=None):
+    """Fit started from beta0; non-converged fits are reported, not dropped"""
+    res = fit_coefficients(X_train, seg_train, λ, beta0, n_threads=CV_THREADS,
+                           maxiter=maxiter or (50 if SOLVER == 'lbfgs' else None))
+    if not res.success:
+        print(f"λ={λ:.4g} did not converge: {res.message}")
+    return res.x
+
+def regularization_path(X, race_indices, ranks, train_idx, val_idx, lambdas, patience=3):
+    """Fit lambdas in descending order, warm-starting each from the previous solution
+    
+    Stops once `patience` consecutive lambdas fail to improve the validation NLL.
+    Returns a list of (λ, score, beta).
+    """
+    X_train, X_val = X[train_idx], X[val_idx]
+    seg_train = build_race_segments(race_indices[train_idx], ranks[train_idx])
+    seg_val = build_race_segments(race_indices[val_idx], ranks[val_idx])
+    
+    beta = np.zeros(X.shape[1])
+    best_score = np.inf
+    stale = 0
+    path = []
+    for λ in sorted(lambdas, reverse=True):
+        beta = _fit_warm(X_train, seg_train, λ, beta)
+        score = segment_log_likelihood_and_grad(beta, X_val, *seg_val, 0.0)[0]
+        path.append((λ, score, beta))
+        
+        if score < best_score:
+            best_score = score
+            stale = 0
+        else:
+            stale += 1
+            if stale >= patience:
+                break
+    return path
+
+def _shared_fold_indices(fold):
+    return np.flatnonzero(_SHARED_CV['train_masks'][fold]), np.flatnonzero(_SHARED_CV['fold_ids'] == fold)
+
+def shared_path_task(args):
+    """Whole regularization path for one fold; returns [(λ, score), ...]"""
+    fold, lambdas, patience = args
+    try:
+        train_idx, val_idx = _shared_fold_indices(fold)
+        path = regularization_path(
+            _SHARED_CV['X'], _SHARED_CV['race_indices'], _SHARED_CV['ranks'],
+            train_idx, val_idx, lambdas, patience
+        )
+        return [(λ, score) for λ, score, _ in path]
+    except Exception as e:
+        print(f"fold={fold} path error: {str(e)}")
+    return []
+
+def shared_warm_task(args):
+    """Single warm-started fit for one fold; returns (score, beta) or None"""
+    fold, λ, beta0 = args
+    try:
+        train_idx, val_idx = _shared_fold_indices(fold)
+        X, race_indices, ranks = _SHARED_CV['X'], _SHARED_CV['race_indices'], _SHARED_CV['ranks']
+        seg_train = build_race_segments(race_indices[train_idx], ranks[train_idx])
+        seg_val = build_race_segments(race_indices[val_idx], ranks[val_idx])
+        beta = _fit_warm(X[train_idx], seg_train, λ, np.zeros(X.shape[1]) if beta0 is None else beta0)
+        return segment_log_likelihood_and_grad(beta, X[val_idx], *seg_val, 0.0)[0], beta
+    except Exception as e:
+        print(f"λ={λ} fold={fold} error: {str(e)}")
+    return None
+
+def run_shared_path_cv(X, race_indices, ranks, folds, lambdas, patience=3, max_workers=None):
+    """Warm-started regularization path per fold, folds in parallel; returns [(λ, score), ...]"""
+    tasks = [(fold, list(lambdas), patience) for fold in range(len(folds))]
+    with shared_cv_pool(X, race_indices, ranks, folds, max_workers) as executor:
+        return [result for path in executor.map(shared_path_task, tasks) for result in path]
+
+def golden_section_lambda(X, race_indices, ranks, folds, log10_bounds=(-4, 1), tol=0.1,
+                          max_evals=20, max_workers=None):
+    """Golden-section search on log10(λ) for the lowest mean CV NLL
+    
+    Each evaluation warm-starts every fold from its solution at the nearest
+    λ already tried. Returns (best λ, {λ: mean score}).
+    """
+    inv_phi = (math.sqrt(5) - 1) / 2
+    warm = [{} for _ in folds]
+    scores = {}
+    
+    with shared_cv_pool(X, race_indices, ranks, folds, max_workers) as executor:
+        def evaluate(log_lam):
+            if log_lam not in scores:
+                tasks = [
+                    (fold, 10 ** log_lam, sols[min(sols, key=lambda l: abs(l - log_lam))] if sols else None)
+                    for fold, sols in enumerate(warm)
+                ]
+                fold_scores = []
+                for fold, result in enumerate(executor.map(shared_warm_task, tasks)):
+                    if result is None:
+                        fold_scores.append(np.inf)
+                        continue
+                    fold_scores.append(result[0])
+                    warm[fold][log_lam] = result[1]
+                scores[log_lam] = np.mean(fold_scores)
+            return scores[log_lam]
+        
+        a, b = log10_bounds
+        c = b - inv_phi * (b - a)
+        d = a + inv_phi * (b - a)
+        fc, fd = evaluate(c), evaluate(d)
+        while b - a > tol and len(scores) < max_evals:
+            if fc < fd:
+                b, d, fd = d, c, fc
+                c = b - inv_phi * (b - a)
+                fc = evaluate(c)
+            else:
+                a, c, fc = c, d, fd
+                d = a + inv_phi * (b - a)
+                fd = evaluate(d)
+    
+    best = min(scores, key=scores.get)
+    return 10 ** best, {10 ** log_lam: score for log_lam, score in scores.items()}
+
 # ----------------------------
 # 4. Prediction Function
 # ----------------------------
 
-def predict_race_outcomes(new_race, beta_hat, scaler, features, n_samples=10000):
-    """Efficient prediction with proper feature name handling"""
+def predict_race_outcomes(new_race, beta_hat, scaler, features, n_samples=10000, exact=False, max_rank=None,
+                          adaptive=False, ci_width=0.01, rng=None, return_errors=False):
+    """Efficient prediction with proper feature name handling
+    
+    With exact=True the first EXACT_RANK_DEPTH rank columns are computed in closed
+    form and Gumbel sampling is only used for deeper positions; max_rank limits
+    how many rank columns are returned. adaptive=True samples those positions with
+    simulate_rank_probabilities (n_samples becomes the cap) and return_errors=True
+    also returns the standard error of every probability.
+    """
     # Convert input to DataFrame with correct feature order
     input_df = pd.DataFrame(new_race, columns=features)
     
     # Scale features with preserved names
     X_scaled = scaler.transform(input_df)
     strengths = X_scaled @ beta_hat
+    n_runners = len(strengths)
+    n_ranks = n_runners if max_rank is None else min(max_rank, n_runners)
+    
+    prob_matrix = np.zeros((n_runners, n_ranks))
+    std_errors = np.zeros((n_runners, n_ranks))
+    n_exact = 0
+    if exact:
+        exact_probs = exact_top_probabilities(strengths)
+        n_exact = min(exact_probs.shape[1], n_ranks)
+        prob_matrix[:, :n_exact] = exact_probs[:, :n_exact]
+        
+        # A single missing position is the complement of the others
+        if n_ranks == n_runners == n_exact + 1:
+            prob_matrix[:, n_exact] = 1.0 - prob_matrix[:, :n_exact].sum(axis=1)
+            n_exact = n_ranks
     
-    # Gumbel sampling
-    np.random.seed(42)
-    noise = np.random.gumbel(0, 1, (n_samples, len(strengths)))
-    samples = np.argsort(-(strengths + noise), axis=1)
+    if n_exact < n_ranks and adaptive:
+        sampled, sampled_err, _ = simulate_rank_probabilities(
+            strengths, n_ranks, ci_width=ci_width, max_samples=n_samples, rng=rng
+        )
+        prob_matrix[:, n_exact:] = sampled[:, n_exact:]
+        std_errors[:, n_exact:] = sampled_err[:, n_exact:]
+    elif n_exact < n_ranks:
+        # Gumbel sampling
+        np.random.seed(42)
+        noise = np.random.gumbel(0, 1, (n_samples, n_runners))
+        samples = np.argsort(-(strengths + noise), axis=1)[:, :n_ranks]
+        
+        # Calculate probabilities
+        sampled = np.zeros((n_runners, n_ranks))
+        np.add.at(sampled, (samples, np.arange(n_ranks)[None,:]), 1)
+        sampled /= n_samples
+        prob_matrix[:, n_exact:] = sampled[:, n_exact:]
+        std_errors[:, n_exact:] = np.sqrt(sampled * (1 - sampled) / n_samples)[:, n_exact:]
+    
+    columns = [f'rank_{i+1}' for i in range(n_ranks)]
+    index = [f'horse_{i+1}' for i in range(n_runners)]
+    predictions = pd.DataFrame(np.around(prob_matrix, 3), columns=columns, index=index)
+    if return_errors:
+        return predictions, pd.DataFrame(std_errors, columns=columns, index=index)
+    return predictions
+
+# ----------------------------
+# 4b. Incremental Model Updates
+# ----------------------------
+
+# Rough per-runner Fisher information per coefficient, only used to build a
+# prior for models saved before the precision matrix was stored
+LEGACY_PRIOR_INFO = 0.1
+
+def update_model(model_data, new_races, maxiter=10):
+    """Fold newly settled races into a trained model without revisiting history
     
-    # Calculate probabilities
-    prob_matrix = np.zeros((len(strengths), len(strengths)))
-    np.add.at(prob_matrix, (samples, np.arange(len(strengths))[None,:]), 1)
-    prob_matrix /= n_samples
+    The previous fit is summarized by its coefficients and precision (Hessian),
+    which act as a Gaussian prior; a few Newton steps on the new races then give
+    the updated coefficients and precision. The scaler statistics are updated
+    with partial_fit and the coefficients rescaled so that old predictions are
+    unchanged before the new data is applied. Runners without a finishing rank
+    are dropped. Returns a new model dict.
+    """
+    features = model_data['features']
+    beta_old = np.asarray(model_data['beta_hat'], dtype=float)
+    scaler_old = model_data['scaler']
+    precision = model_data.get('precision')
+    if precision is None:
+        precision = np.eye(len(features)) * LEGACY_PRIOR_INFO * scaler_old.n_samples_seen_
     
-    return pd.DataFrame(
-        np.around(prob_matrix, 3),
-        columns=[f'rank_{i+1}' for i in range(len(strengths))],
-        index=[f'horse_{i+1}' for i in range(len(strengths))]
-    )
+    races = new_races.dropna(subset=['rank'] + features).copy()
+    races['rank'] = races['rank'].astype(np.int64)
+    races, race_ids = clean_and_index_races(races)
+    if races.empty:
+        return dict(model_data)
+    
+    # Running mean/variance, then re-express the old fit on the new scale
+    scaler = copy.deepcopy(scaler_old)
+    scaler.partial_fit(races[features])
+    ratio = scaler.scale_ / scaler_old.scale_
+    beta_prior = beta_old * ratio
+    precision = precision / np.outer(ratio, ratio)
+    
+    races[features] = scaler.transform(races[features])
+    races = races.sort_values(['race_idx', 'rank'], kind='stable').reset_index(drop=True)
+    X, segments = kernel_arrays(races[features].values,
+                                build_race_segments(races['race_idx'].values, races['rank'].values))
+    kernel = select_likelihood(1, hessian=True)
+    
+    def objective(beta):
+        f, grad, hess = kernel(beta, X, *segments, 0.0)
+        diff = beta - beta_prior
+        return f + 0.5 * diff @ precision @ diff, grad + precision @ diff, hess + precision
+    
+    result = newton_minimize(objective, beta_prior, maxiter=maxiter)
+    if not result.success:
+        print(f"Incremental update did not converge: {result.message}")
+    
+    updated = dict(model_data)
+    updated.update({
+        'beta_hat': result.x,
+        'std_err': result.std_err,
+        'precision': result.hess,
+        'scaler': scaler,
+        'n_updates': model_data.get('n_updates', 0) + 1,
+        'n_update_races': model_data.get('n_update_races', 0) + len(race_ids)
+    })
+    return updated
+
+def update_model_file(model_path, results_path, output_path=None):
+    """Apply update_model to a pickled model using settled races from a processed JSON file
+    
+    The updated model is pickled to output_path (default: model_path) and also
+    written as the .npz artifact next to it, which is what the bet finders load.
+    """
+    with open(model_path, 'rb') as f:
+        model_data = pickle.load(f)
+    with open(results_path, "r") as f:
+        new_races = pd.DataFrame(json.load(f))
+    
+    if 'rank' not in new_races:
+        print(f"No finishing ranks in {results_path}; model left unchanged")
+        return model_data
+    
+    updated = update_model(model_data, new_races)
+    output_path = output_path or model_path
+    with open(output_path, 'wb') as f:
+        pickle.dump(updated, f)
+    save_model_artifact(os.path.splitext(output_path)[0] + '.npz', updated)
+    print(f"Updated model with {updated.get('n_update_races', 0) - model_data.get('n_update_races', 0)} races")
+    return updated
+
 # ----------------------------
 # 5. Main Execution
 # ----------------------------
@@ -152,64 +1066,66 @@ if __name__ == "__main__":
     # Configuration
     features = ['Hwinper', 'wt.carried', 'rating', 'Jwinper', 'age', 'logOdds', 'wdproduct', "form"]
     
+    # Compile (or load cached) kernels up front so CV workers hit the disk cache
+    warm_up()
+    
     # Load data
-    df, scaler, race_ids = load_and_preprocess_data("testRaceData.json", features)
-    X = df[features].values
+    df, scaler, race_ids, segments = load_and_preprocess_data("testRaceData.json", features)
+    X, segments = kernel_arrays(df[features].values, segments)
     race_indices = df['race_idx'].values
     ranks = df['rank'].values
 
     # Cross-validation setup
-    lambdas = [0.001, 0.01, 0.1, 1]
+    lambdas = np.logspace(1, -4, 21)
     n_folds = 3
-    cv_args = [
-        (train_idx, val_idx, λ, X, race_indices, ranks, features)
-        for λ in lambdas
-        for train_idx, val_idx in KFold(n_folds).split(X)
-    ]
+    folds = race_folds(race_indices, n_folds)
 
-    # Execute CV
-    with ProcessPoolExecutor() as executor:
-        results = list(executor.map(parallel_cv, cv_args))
+    # Execute CV: warm-started path per fold, largest lambda first
+    results = run_shared_path_cv(X, race_indices, ranks, folds, lambdas)
 
     # Process results
     lambda_scores = defaultdict(list)
     for result in results:
         if result: lambda_scores[result[0]].append(result[1])
     
-    # Select best lambda
+    # Select best lambda among those every fold reached before stopping early
     best_lambda = min(
-        ( (λ, np.mean(scores)) for λ, scores in lambda_scores.items() ),
+        ( (λ, np.mean(scores)) for λ, scores in lambda_scores.items() if len(scores) == len(folds) ),
         key=lambda x: x[1]
     )[0]
     
     print(f"Best lambda: {best_lambda}")
 
     # Final training
-    result = minimize(
-        lambda p: fast_log_likelihood(p, X, race_indices, ranks, best_lambda),
-        np.zeros(len(features)),
-        method='L-BFGS-B',
-        options={'maxiter': 100}
-    )
+    result = fit_coefficients(X, segments, best_lambda, n_threads=FIT_THREADS)
     
     if not result.success:
         raise RuntimeError(f"Optimization failed: {result.message}")
     
     beta_hat = result.x
-    print("\nTrained Coefficients:")
+    std_err = result.get('std_err', np.full(len(features), np.nan))
+    precision = result.get('hess')
+    if precision is None:
+        precision = segment_log_likelihood_grad_hess(beta_hat, X, *segments, best_lambda)[2]
+    print(f"\nTrained Coefficients ({SOLVER}, {result.nit} iterations):")
     print(pd.DataFrame({
         'feature': features,
-        'coefficient': beta_hat
+        'coefficient': beta_hat,
+        'std_err': std_err
     }))
     
-    # Save model
+    # Save model (pickle for training tools, compact arrays for the bet finders)
+    model_data = {
+        'beta_hat': beta_hat,
+        'std_err': std_err,
+        'precision': precision,
+        'scaler': scaler,
+        'features': features,
+        'lambda': best_lambda
+    }
     with open('model2.pkl', 'wb') as f:
-        pickle.dump({
-            'beta_hat': beta_hat,
-            'scaler': scaler,
-            'features': features,
-            'lambda': best_lambda
-        }, f)
+        pickle.dump(model_data, f)
+    save_model_artifact('model2.npz', model_data)
 
     # Example prediction
     new_race = {
@@ -228,7 +1144,8 @@ if __name__ == "__main__":
         beta_hat=beta_hat,
         scaler=scaler,
         features=features,
-        n_samples=100000
+        n_samples=100000,
+        exact=True
     )
     
     print("\nPredicted Probabilities:")
@@ -0,0 +1,122 @@
+import os
+import pickle
+import threading
+import numpy as np
+
+# ----------------------------
+# 1. Compact Model Artifact
+# ----------------------------
+
+ARTIFACT_VERSION = 1
+
+class ArrayScaler:
+    """NumPy-only stand-in for a fitted StandardScaler (transform only)"""
+
+    def __init__(self, mean, scale):
+        self.mean_ = np.asarray(mean, dtype=float)
+        self.scale_ = np.asarray(scale, dtype=float)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=float) - self.mean_) / self.scale_
+
+def save_model_artifact(path, model_data):
+    """Write a model dict (as pickled by logitRegression15) as plain arrays in an .npz file"""
+    arrays = {
+        'version': np.array(ARTIFACT_VERSION),
+        'features': np.array(model_data['features'], dtype=str),
+        'beta_hat': np.asarray(model_data['beta_hat'], dtype=float),
+        'mean': np.asarray(model_data['scaler'].mean_, dtype=float),
+        'scale': np.asarray(model_data['scaler'].scale_, dtype=float),
+        'lambda': np.array(model_data['lambda'], dtype=float),
+    }
+    for key in ('std_err', 'precision'):
+        if model_data.get(key) is not None:
+            arrays[key] = np.asarray(model_data[key], dtype=float)
+
+    # np.savez appends .npz to other names, so write through a file handle
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+def _load_npz(path):
+    with np.load(path, allow_pickle=False) as data:
+        version = int(data['version'])
+        if version > ARTIFACT_VERSION:
+            raise ValueError(f"{path}: artifact version {version} is newer than supported ({ARTIFACT_VERSION})")
+        model = {
+            'version': version,
+            'features': [str(f) for f in data['features']],
+            'beta_hat': data['beta_hat'],
+            'scaler': ArrayScaler(data['mean'], data['scale']),
+            'lambda': float(data['lambda']),
+        }
+        for key in ('std_err', 'precision'):
+            if key in data:
+                model[key] = data[key]
+    return model
+
+def _load_pickle(path):
+    """Legacy model2.pkl; the sklearn scaler is swapped for an ArrayScaler"""
+    with open(path, 'rb') as f:
+        model = dict(pickle.load(f))
+    model['scaler'] = ArrayScaler(model['scaler'].mean_, model['scaler'].scale_)
+    model.setdefault('version', 0)
+    return model
+
+# Loaders by file extension
+LOADERS = {
+    '.npz': _load_npz,
+    '.pkl': _load_pickle,
+}
+
+def validate_model(model, path):
+    """Raise ValueError unless the coefficient and scaler arrays match the feature list"""
+    n_features = len(model['features'])
+    if n_features == 0:
+        raise ValueError(f"{path}: model has no features")
+    for name, values in (('beta_hat', model['beta_hat']), ('mean', model['scaler'].mean_),
+                         ('scale', model['scaler'].scale_)):
+        if np.shape(values) != (n_features,):
+            raise ValueError(f"{path}: {name} has shape {np.shape(values)}, expected ({n_features},)")
+        if not np.all(np.isfinite(values)):
+            raise ValueError(f"{path}: {name} contains non-finite values")
+    if np.any(model['scaler'].scale_ <= 0):
+        raise ValueError(f"{path}: scale must be positive")
+
+def load_model_artifact(path):
+    """Load and validate a model with the loader registered for its extension"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in LOADERS:
+        raise ValueError(f"{path}: no model loader for '{ext}' files (known: {', '.join(LOADERS)})")
+    model = LOADERS[ext](path)
+    validate_model(model, path)
+    return model
+
+# ----------------------------
+# 2. In-process Registry
+# ----------------------------
+
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+
+def get_model(path):
+    """Return the model at path, loading it once and reloading only when the file changes"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    with _REGISTRY_LOCK:
+        cached = _REGISTRY.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        model = load_model_artifact(path)
+        _REGISTRY[path] = (stamp, model)
+        return model
+
+def clear_registry():
+    with _REGISTRY_LOCK:
+        _REGISTRY.clear()
+
+if __name__ == "__main__":
+    # Convert the pickled model into the compact artifact
+    save_model_artifact("model2.npz", _load_pickle("model2.pkl"))
+    print(f"Wrote model2.npz ({os.path.getsize('model2.npz')} bytes)")
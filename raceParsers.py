@@ -0,0 +1,395 @@
+import os
+import json
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import html as lxml_html, etree
+except ImportError:
+    lxml_html = None
+
+# ----------------------------
+# 1. Page Parsers (HTML in, plain data out)
+# ----------------------------
+
+def parse_meeting_index(html):
+    """[(meeting title, [race hrefs])] for every meeting block on a results index page"""
+    soup = BeautifulSoup(html, 'html.parser')
+    meetings = []
+    for location in soup.find_all("div", {"class": "sdc-site-concertina-block__inner"}):
+        title_span = location.find("span", {"class": "sdc-site-concertina-block__title"})
+        if not title_span:
+            continue
+        hrefs = [link['href'] for link in location.find_all('a', {'class': 'sdc-site-racing-meetings__event-link'})]
+        meetings.append((title_span.text.strip(), hrefs))
+    return meetings
+
+def parse_intermediate_page(html):
+    """Racecard href from an event page's horse racing message, or None"""
+    soup = BeautifulSoup(html, 'html.parser')
+    message_div = soup.find('div', class_='sdc-site-message--horseracing')
+    if message_div:
+        racecard_link = message_div.find('a', class_='sdc-site-message__link',
+                                         string=lambda text: 'Racecard' in text)
+        if racecard_link:
+            return racecard_link['href']
+    return None
+
+def parse_racecard_or(html):
+    """{horse name: official rating} from a racecard page"""
+    soup = BeautifulSoup(html, 'html.parser')
+    or_data = {}
+    for card in soup.find_all('div', {'class': 'sdc-site-racing-card__item'}):
+        name_tag = card.find('h4', {'class': 'sdc-site-racing-card__name'})
+        if name_tag:
+            horse_name = name_tag.text.strip()
+            or_tag = card.find('li', {'data-label': 'OR'})
+            or_data[horse_name] = or_tag.find('strong').text.strip() if or_tag else 'N/A'
+    return or_data
+
+def parse_jockey_win_percentage(html):
+    """Season (Jump) win percentage from a jockey profile, or 'N/A'"""
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', class_='sdc-site-scrolling-table__table')
+    if not table:
+        return 'N/A'
+    for row in table.find_all('tr'):
+        cells = row.find_all('td')
+        if len(cells) >= 6 and 'Season (Jump)' in cells[0].get_text():
+            return cells[5].get_text(strip=True)
+    return 'N/A'
+
+def parse_horse_win_percentage(html):
+    """Win percentage from a horse profile; None when the profile has no stats table"""
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', class_='sdc-site-scrolling-table__table')
+    if not table:
+        return None
+    tds = table.find_all('td')
+    return tds[5].text.strip() if len(tds) > 5 else 'N/A'
+
+def _card_text(card, tag, attrs):
+    found = card.find(tag, attrs)
+    return found.text.strip() if found else ''
+
+def _card_label(card, label):
+    found = card.find('li', {'data-label': label})
+    return found.find('strong').text.strip() if found else ''
+
+def parse_race_page(html):
+    """Race header details and one dict per runner card (profile links as hrefs)"""
+    soup = BeautifulSoup(html, 'html.parser')
+    race_name_tag = soup.find("h3", {"class": "sdc-site-racing-header__description"})
+    race_name = race_name_tag.text.strip() if race_name_tag else "Unknown Race"
+
+    # Track length extraction
+    track_length = "N/A"
+    for item in soup.find_all('li', {'class': 'sdc-site-racing-header__details-item'}):
+        if "Distance:" in item.text:
+            track_length = item.find('strong').next_sibling.strip()
+            break
+
+    racecard_link = soup.find('a', {'class': 'sdc-site-racing-status__link'})
+    race_title = soup.find("h2", {"class": "sdc-site-racing-header__name"}).text.strip()
+
+    runners = []
+    for card in soup.find_all('div', {'class': 'sdc-site-racing-card__item'}):
+        horse_name_tag = card.find('h4', {'class': 'sdc-site-racing-card__name'})
+        horse_link_tag = horse_name_tag.find("a") if horse_name_tag else None
+        trainer = card.find('a', {'href': lambda x: x and '/racing/form-profiles/trainer/' in x})
+        jockey_tag = card.find('a', {'href': lambda x: x and '/racing/form-profiles/jockey/' in x})
+
+        runners.append({
+            'Position': _card_text(card, 'span', {'class': 'sdc-site-racing-card__position'}),
+            'Number': _card_text(card, 'div', {'class': 'sdc-site-racing-card__number'}),
+            'Horse Name': horse_link_tag.text.strip() if horse_link_tag else
+                          (horse_name_tag.text.strip() if horse_name_tag else ''),
+            'Last Run Days': _card_text(card, 'span', {'class': 'sdc-site-racing-card__last-run'}),
+            'Betting Odds': _card_text(card, 'span', {'class': 'sdc-site-racing-card__betting-odds'}),
+            'Form': _card_label(card, 'Form'),
+            'Age': _card_label(card, 'Age'),
+            'Weight': _card_label(card, 'Wgt'),
+            'Trainer': trainer.text.strip() if trainer else '',
+            'Jockey': jockey_tag.text.strip() if jockey_tag else 'N/A',
+            'Summary': _card_text(card, 'p', {'class': 'sdc-site-racing-card__summary'}),
+            'jockey_href': jockey_tag['href'] if jockey_tag else None,
+            'horse_href': horse_link_tag["href"] if horse_link_tag else None,
+        })
+
+    return {
+        'race_name': race_name,
+        'track_length': track_length,
+        'racecard_href': racecard_link['href'] if racecard_link else None,
+        'time': race_title.split(" ", 1)[0],
+        'location': race_title.split(" ", 1)[1],
+        'runners': runners,
+    }
+
+# ----------------------------
+# 1b. lxml Backend
+# ----------------------------
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+if lxml_html is not None:
+    # Selectors compiled once; every card field is the first match under its card
+    _XP = {key: etree.XPath(path) for key, path in {
+        'meeting': f"//div[{_has_class('sdc-site-concertina-block__inner')}]",
+        'meeting_title': f".//span[{_has_class('sdc-site-concertina-block__title')}]",
+        'event_link': f".//a[{_has_class('sdc-site-racing-meetings__event-link')}]/@href",
+        'message': f"//div[{_has_class('sdc-site-message--horseracing')}]",
+        'message_link': f".//a[{_has_class('sdc-site-message__link')}]",
+        'stats_table': f"//table[{_has_class('sdc-site-scrolling-table__table')}]",
+        'rows': ".//tr",
+        'cells': "./td",
+        'all_cells': ".//td",
+        'race_name': f"//h3[{_has_class('sdc-site-racing-header__description')}]",
+        'details': f"//li[{_has_class('sdc-site-racing-header__details-item')}]",
+        'status_link': f"//a[{_has_class('sdc-site-racing-status__link')}]/@href",
+        'race_title': f"//h2[{_has_class('sdc-site-racing-header__name')}]",
+        'cards': f"//div[{_has_class('sdc-site-racing-card__item')}]",
+        'name': f".//h4[{_has_class('sdc-site-racing-card__name')}]",
+        'position': f".//span[{_has_class('sdc-site-racing-card__position')}]",
+        'number': f".//div[{_has_class('sdc-site-racing-card__number')}]",
+        'last_run': f".//span[{_has_class('sdc-site-racing-card__last-run')}]",
+        'odds': f".//span[{_has_class('sdc-site-racing-card__betting-odds')}]",
+        'summary': f".//p[{_has_class('sdc-site-racing-card__summary')}]",
+        'label': ".//li[@data-label=$label]",
+        'trainer': ".//a[contains(@href, '/racing/form-profiles/trainer/')]",
+        'jockey': ".//a[contains(@href, '/racing/form-profiles/jockey/')]",
+        'link': ".//a",
+        'strong': ".//strong",
+    }.items()}
+
+def _document(html):
+    """Parsed page; an empty <html> element when lxml rejects the document as empty (bs4 finds nothing)"""
+    try:
+        return lxml_html.fromstring(html)
+    except etree.ParserError:
+        return lxml_html.Element('html')
+
+def _first(key, node, **variables):
+    found = _XP[key](node, **variables)
+    return found[0] if found else None
+
+def _text(node):
+    return str(node.text_content()).strip()
+
+def _string(node):
+    """bs4's .string: the text of a node's only child, descending through single-child tags, else None"""
+    while len(node):
+        if len(node) > 1 or node.text or node[0].tail:
+            return None
+        node = node[0]
+    return node.text
+
+def _first_text(key, node):
+    found = _first(key, node)
+    return _text(found) if found is not None else ''
+
+def _label_text(card, label):
+    found = _first('label', card, label=label)
+    return _text(_first('strong', found)) if found is not None else ''
+
+def lxml_parse_meeting_index(html):
+    meetings = []
+    for location in _XP['meeting'](_document(html)):
+        title_span = _first('meeting_title', location)
+        if title_span is None:
+            continue
+        meetings.append((_text(title_span), [str(h) for h in _XP['event_link'](location)]))
+    return meetings
+
+def lxml_parse_intermediate_page(html):
+    message_div = _first('message', _document(html))
+    if message_div is not None:
+        for link in _XP['message_link'](message_div):
+            text = _string(link)
+            if text is not None and 'Racecard' in text:
+                return link.get('href')
+    return None
+
+def lxml_parse_racecard_or(html):
+    or_data = {}
+    for card in _XP['cards'](_document(html)):
+        name_tag = _first('name', card)
+        if name_tag is not None:
+            or_tag = _first('label', card, label='OR')
+            or_data[_text(name_tag)] = _text(_first('strong', or_tag)) if or_tag is not None else 'N/A'
+    return or_data
+
+def lxml_parse_jockey_win_percentage(html):
+    table = _first('stats_table', _document(html))
+    if table is None:
+        return 'N/A'
+    for row in _XP['rows'](table):
+        cells = _XP['cells'](row)
+        if len(cells) >= 6 and 'Season (Jump)' in cells[0].text_content():
+            return _text(cells[5])
+    return 'N/A'
+
+def lxml_parse_horse_win_percentage(html):
+    table = _first('stats_table', _document(html))
+    if table is None:
+        return None
+    tds = _XP['all_cells'](table)
+    return _text(tds[5]) if len(tds) > 5 else 'N/A'
+
+def lxml_parse_race_page(html):
+    doc = _document(html)
+    race_name_tag = _first('race_name', doc)
+    race_name = _text(race_name_tag) if race_name_tag is not None else "Unknown Race"
+
+    track_length = "N/A"
+    for item in _XP['details'](doc):
+        if "Distance:" in item.text_content():
+            track_length = (_first('strong', item).tail or '').strip()
+            break
+
+    racecard_href = _first('status_link', doc)
+    race_title = _text(_XP['race_title'](doc)[0])
+
+    runners = []
+    for card in _XP['cards'](doc):
+        horse_name_tag = _first('name', card)
+        horse_link_tag = _first('link', horse_name_tag) if horse_name_tag is not None else None
+        trainer = _first('trainer', card)
+        jockey_tag = _first('jockey', card)
+
+        runners.append({
+            'Position': _first_text('position', card),
+            'Number': _first_text('number', card),
+            'Horse Name': _text(horse_link_tag) if horse_link_tag is not None else
+                          (_text(horse_name_tag) if horse_name_tag is not None else ''),
+            'Last Run Days': _first_text('last_run', card),
+            'Betting Odds': _first_text('odds', card),
+            'Form': _label_text(card, 'Form'),
+            'Age': _label_text(card, 'Age'),
+            'Weight': _label_text(card, 'Wgt'),
+            'Trainer': _text(trainer) if trainer is not None else '',
+            'Jockey': _text(jockey_tag) if jockey_tag is not None else 'N/A',
+            'Summary': _first_text('summary', card),
+            'jockey_href': jockey_tag.get('href') if jockey_tag is not None else None,
+            'horse_href': horse_link_tag.get('href') if horse_link_tag is not None else None,
+        })
+
+    return {
+        'race_name': race_name,
+        'track_length': track_length,
+        'racecard_href': str(racecard_href) if racecard_href is not None else None,
+        'time': race_title.split(" ", 1)[0],
+        'location': race_title.split(" ", 1)[1],
+        'runners': runners,
+    }
+
+# ----------------------------
+# 1c. Backend Selection
+# ----------------------------
+
+PARSER_BACKENDS = {
+    'bs4': {
+        'meeting_index': parse_meeting_index,
+        'intermediate_page': parse_intermediate_page,
+        'racecard_or': parse_racecard_or,
+        'jockey_win_percentage': parse_jockey_win_percentage,
+        'horse_win_percentage': parse_horse_win_percentage,
+        'race_page': parse_race_page,
+    },
+}
+if lxml_html is not None:
+    PARSER_BACKENDS['lxml'] = {
+        'meeting_index': lxml_parse_meeting_index,
+        'intermediate_page': lxml_parse_intermediate_page,
+        'racecard_or': lxml_parse_racecard_or,
+        'jockey_win_percentage': lxml_parse_jockey_win_percentage,
+        'horse_win_percentage': lxml_parse_horse_win_percentage,
+        'race_page': lxml_parse_race_page,
+    }
+
+def select_parsers(backend=None):
+    """Parser functions by page type: the named backend, else lxml when installed, else bs4"""
+    if backend is None:
+        backend = 'lxml' if 'lxml' in PARSER_BACKENDS else 'bs4'
+    if backend not in PARSER_BACKENDS:
+        print(f"Parser backend '{backend}' unavailable, using bs4")
+        backend = 'bs4'
+    return PARSER_BACKENDS[backend]
+
+def _outcome(parser, html):
+    try:
+        return parser(html)
+    except Exception as e:
+        return f"raised {type(e).__name__}"
+
+def compare_backends(pages, backend='lxml', page_types=None):
+    """Run the bs4 and another backend over {name: html} pages and compare
+
+    Pages are tried with every parser in page_types (default: all). A page counts
+    as a mismatch when the two backends return different data, or only one of
+    them raises. Returns ([(name, page type, bs4 result, other result)],
+    {backend: seconds spent parsing}).
+    """
+    reference, candidate = PARSER_BACKENDS['bs4'], PARSER_BACKENDS[backend]
+    page_types = page_types or list(reference)
+
+    mismatches = []
+    seconds = {'bs4': 0.0, backend: 0.0}
+    for name, html in pages.items():
+        for page_type in page_types:
+            started = time.perf_counter()
+            expected = _outcome(reference[page_type], html)
+            seconds['bs4'] += time.perf_counter() - started
+            started = time.perf_counter()
+            actual = _outcome(candidate[page_type], html)
+            seconds[backend] += time.perf_counter() - started
+
+            both_raised = isinstance(expected, str) and isinstance(actual, str) and \
+                expected.startswith('raised') and actual.startswith('raised')
+            if expected != actual and not both_raised:
+                mismatches.append((name, page_type, expected, actual))
+    return mismatches, seconds
+
+def check_parity(cache_dir=".http_cache", backend='lxml', page_types=None):
+    """compare_backends over every page saved in the HTTP cache; prints a timing summary"""
+    with open(os.path.join(cache_dir, 'index.json'), 'r') as f:
+        index = json.load(f)
+    pages = {}
+    for url, entry in index.items():
+        with open(os.path.join(cache_dir, 'bodies', entry['hash']), 'r', encoding='utf-8') as f:
+            pages[url] = f.read()
+
+    mismatches, seconds = compare_backends(pages, backend, page_types)
+    print(f"Parser parity over {len(index)} cached pages: {len(mismatches)} mismatches "
+          f"(bs4 {seconds['bs4']:.2f}s, {backend} {seconds[backend]:.2f}s)")
+    return mismatches
+
+# ----------------------------
+# 2. Parsing Executor
+# ----------------------------
+
+_PARSE_POOL = {}
+
+def parse_pool(max_workers=None):
+    """Process pool for page parsing, created on first use and reused across scrapes
+
+    Spawned (not forked) workers, since the app process may already own numba's
+    thread pool from the bet finders.
+    """
+    max_workers = max_workers or os.cpu_count()
+    if max_workers not in _PARSE_POOL:
+        _PARSE_POOL[max_workers] = ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context('spawn'))
+    return _PARSE_POOL[max_workers]
+
+async def parse_off_loop(parser, html, max_workers=None):
+    """Run parser(html) in the parse pool so the event loop keeps fetching; max_workers=0 parses inline"""
+    if max_workers == 0:
+        return parser(html)
+    return await asyncio.get_running_loop().run_in_executor(parse_pool(max_workers), parser, html)
+
+if __name__ == "__main__":
+    for url, page_type, expected, actual in check_parity()[:20]:
+        print(f"{page_type} {url}\n  bs4:  {expected}\n  lxml: {actual}")
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+# ----------------------------
+# 1. Rank Probabilities
+# ----------------------------
+
+EXACT_RANK_DEPTH = 3
+
+def exact_top_probabilities(strengths, depth=EXACT_RANK_DEPTH):
+    """Exact Plackett-Luce probabilities of finishing 1st..depth-th (depth <= 3)
+
+    strengths is either one race (n,) or a padded card (races, max_field) where
+    empty slots hold -inf; the result gains a trailing depth axis.
+    """
+    strengths = np.asarray(strengths, dtype=float)
+    n = strengths.shape[-1]
+    depth = min(depth, n, EXACT_RANK_DEPTH)
+    w = np.exp(strengths - np.max(strengths, axis=-1, keepdims=True))
+    W = w.sum(axis=-1, keepdims=True)
+
+    probs = np.zeros(strengths.shape + (depth,))
+    p1 = w / W
+    probs[..., 0] = p1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if depth >= 2:
+            # Sum over the winner j != i of P(j wins) * P(i best of the rest)
+            rest1 = W - w
+            a = np.where(rest1 > 0, p1 / rest1, 0.0)
+            probs[..., 1] = w * (a.sum(axis=-1, keepdims=True) - a)
+
+        if depth >= 3:
+            # Sum over ordered (j, k) prefixes not containing i
+            rest2 = rest1[..., :, None] - w[..., None, :]
+            M = np.where(rest2 > 0, a[..., :, None] * w[..., None, :] / rest2, 0.0)
+            diag = np.arange(n)
+            M[..., diag, diag] = 0.0
+            probs[..., 2] = w * (M.sum(axis=(-2, -1))[..., None] - M.sum(axis=-1) - M.sum(axis=-2))
+
+    return probs
+
+def simulate_rank_probabilities(strengths, n_ranks=None, ci_width=0.01, batch_size=2000,
+                                min_samples=2000, max_samples=100000, rng=None):
+    """Adaptive antithetic Gumbel simulation of the rank distribution
+
+    Draws antithetic pairs (U, 1 - U) in batches until the widest 95% confidence
+    interval across all (runner, rank) cells is below ci_width or max_samples is
+    reached. Returns (probabilities, standard errors, samples used).
+    """
+    rng = np.random.default_rng(rng)
+    strengths = np.asarray(strengths, dtype=float)
+    n_runners = len(strengths)
+    n_ranks = n_runners if n_ranks is None else min(n_ranks, n_runners)
+    positions = np.arange(n_ranks)
+
+    total = np.zeros((n_runners, n_ranks))
+    total_sq = np.zeros((n_runners, n_ranks))
+    n_pairs = 0
+
+    while 2 * n_pairs < max_samples:
+        m = min(batch_size, max_samples - 2 * n_pairs) // 2
+        if m == 0:
+            break
+        u = rng.random((m, n_runners))
+
+        pair = np.zeros((m, n_runners, n_ranks))
+        with np.errstate(divide='ignore'):
+            for draw in (u, 1.0 - u):
+                order = np.argsort(-(strengths - np.log(-np.log(draw))), axis=1)[:, :n_ranks]
+                pair[np.arange(m)[:, None], order, positions[None, :]] += 0.5
+
+        total += pair.sum(axis=0)
+        total_sq += (pair ** 2).sum(axis=0)
+        n_pairs += m
+
+        probs = total / n_pairs
+        std_err = np.sqrt(np.maximum(total_sq / n_pairs - probs ** 2, 0.0) / n_pairs)
+        if 2 * n_pairs >= min_samples and 2 * 1.96 * std_err.max() <= ci_width:
+            break
+
+    return probs, std_err, 2 * n_pairs
+
+# ----------------------------
+# 2. Card Prediction
+# ----------------------------
+
+def card_slots(codes, sort_key=None):
+    """Race row and position of every runner in a padded (races, max_field) array
+
+    codes are race codes from pd.factorize. Runners keep their card order within
+    a race, or are placed by ascending sort_key. Returns (slots, field sizes).
+    """
+    order = np.argsort(codes, kind='stable') if sort_key is None else np.lexsort((sort_key, codes))
+    field_sizes = np.bincount(codes)
+    race_starts = np.concatenate(([0], np.cumsum(field_sizes)[:-1]))
+    slots = np.empty(len(codes), dtype=np.int64)
+    slots[order] = np.arange(len(codes)) - race_starts[codes[order]]
+    return slots, field_sizes
+
+def predict_card_outcomes(runners, beta_hat, scaler, features, race_col='race_id'):
+    """Exact win/top-2/top-3 probabilities for every runner of a card in one pass
+
+    Scales once, computes all strengths with a single matmul and evaluates every
+    race together on a padded (races, max_field) array. Returns a frame aligned
+    with runners' index (empty when there are no runners).
+    """
+    columns = ['model_prob_win', 'model_prob_top2', 'model_prob_top3']
+    if len(runners) == 0:
+        return pd.DataFrame(columns=columns, index=runners.index, dtype=float)
+
+    X_scaled = scaler.transform(runners[features])
+    strengths = X_scaled @ beta_hat
+
+    # Slot each runner into its race row of the padded array
+    codes, _ = pd.factorize(runners[race_col])
+    slots, field_sizes = card_slots(codes)
+
+    padded = np.full((len(field_sizes), field_sizes.max(initial=0)), -np.inf)
+    padded[codes, slots] = strengths
+    probs = exact_top_probabilities(padded)[codes, slots]
+
+    # Pad to three columns for cards whose biggest field has fewer runners
+    cumulative = np.cumsum(probs, axis=1)
+    cumulative = np.pad(cumulative, ((0, 0), (0, EXACT_RANK_DEPTH - cumulative.shape[1])), mode='edge')
+
+    return pd.DataFrame(
+        np.around(cumulative, 3),
+        columns=columns,
+        index=runners.index
+    )
@@ -0,0 +1,185 @@
+import math
+import numpy as np
+import pandas as pd
+from racePrediction import EXACT_RANK_DEPTH, card_slots, exact_top_probabilities, simulate_rank_probabilities
+
+# Largest subset DP (subsets visited x field size) before falling back to simulation
+SUBSET_WORK_LIMIT = 2_000_000
+
+# ----------------------------
+# 1. Place Probabilities
+# ----------------------------
+
+def subset_rank_probabilities(strengths, depth):
+    """Exact Plackett-Luce probabilities of finishing 1st..depth-th for one race
+
+    Dynamic programming over the set S of runners already home: layer m holds
+    every m-runner set with the probability that it fills the first m places in
+    any order, and runner j finishes (m+1)-th from S with f(S) w_j / (W - w(S)).
+    Sets are int64 bit masks merged with np.unique, so fields are limited to 63.
+    """
+    strengths = np.asarray(strengths, dtype=float)
+    n = len(strengths)
+    depth = min(depth, n)
+    w = np.exp(strengths - strengths.max())
+    bits = np.left_shift(1, np.arange(n, dtype=np.int64))
+
+    masks = np.zeros(1, dtype=np.int64)
+    f = np.ones(1)
+    taken = np.zeros(1)
+    probs = np.zeros((n, depth))
+    for m in range(depth):
+        remaining = np.maximum(w.sum() - taken, np.finfo(float).tiny)
+        free = (masks[:, None] & bits[None, :]) == 0
+        step = np.where(free, (f / remaining)[:, None] * w[None, :], 0.0)
+        probs[:, m] = step.sum(axis=0)
+        if m + 1 == depth:
+            break
+
+        # Extend every set by one runner and merge sets reached in different orders
+        rows, cols = np.nonzero(free)
+        masks, inverse = np.unique(masks[rows] | bits[cols], return_inverse=True)
+        f = np.bincount(inverse, weights=step[rows, cols], minlength=len(masks))
+        new_taken = np.empty(len(masks))
+        new_taken[inverse] = taken[rows] + w[cols]
+        taken = new_taken
+    return probs
+
+def subset_work(n_runners, depth):
+    """Subsets visited times field size for subset_rank_probabilities"""
+    return n_runners * sum(math.comb(n_runners, m) for m in range(min(depth, n_runners)))
+
+def rank_probabilities(strengths, depth, rng=None):
+    """Probabilities of finishing 1st..depth-th: closed form up to EXACT_RANK_DEPTH, subset DP
+    beyond it, and simulate_rank_probabilities when the DP would exceed SUBSET_WORK_LIMIT
+    """
+    strengths = np.asarray(strengths, dtype=float)
+    depth = min(depth, len(strengths))
+    if depth <= EXACT_RANK_DEPTH:
+        return exact_top_probabilities(strengths, depth)
+    if len(strengths) <= 63 and subset_work(len(strengths), depth) <= SUBSET_WORK_LIMIT:
+        return subset_rank_probabilities(strengths, depth)
+    return simulate_rank_probabilities(strengths, depth, rng=rng)[0]
+
+def each_way_terms(field_size, handicap=False):
+    """Standard UK each-way terms as (places paid, fraction of the win odds)"""
+    if field_size < 5:
+        return 1, 1.0
+    if field_size < 8:
+        return 2, 0.25
+    if handicap and field_size >= 16:
+        return 4, 0.25
+    if handicap and field_size >= 12:
+        return 3, 0.25
+    return 3, 0.2
+
+# ----------------------------
+# 2. Card Pricing
+# ----------------------------
+
+def card_strengths(runners, beta_hat, scaler, features):
+    """Model strength (log-weight) of every runner"""
+    return scaler.transform(runners[features]) @ beta_hat
+
+def card_place_probabilities(runners, strengths, race_col='race_id', places=None):
+    """Each-way terms and exact place probability for every runner
+
+    places overrides the each-way terms with a fixed number of places paid.
+    Races whose terms need at most EXACT_RANK_DEPTH places are priced together
+    in closed form; deeper terms go through rank_probabilities race by race.
+    """
+    race_ids = runners[race_col]
+    codes, uniques = pd.factorize(race_ids)
+    slots, field_sizes = card_slots(codes)
+
+    if places is None:
+        terms = [each_way_terms(size, 'handicap' in str(race).lower())
+                 for race, size in zip(uniques, field_sizes)]
+        race_places = np.array([t[0] for t in terms])
+        race_fraction = np.array([t[1] for t in terms])
+    else:
+        race_places = np.minimum(places, field_sizes)
+        race_fraction = np.ones(len(field_sizes))
+
+    padded = np.full((len(field_sizes), field_sizes.max(initial=0)), -np.inf)
+    padded[codes, slots] = strengths
+    place_prob = np.zeros(padded.shape)
+
+    shallow = race_places <= EXACT_RANK_DEPTH
+    if shallow.any():
+        cumulative = np.cumsum(exact_top_probabilities(padded[shallow]), axis=-1)
+        place_prob[shallow] = np.take_along_axis(
+            cumulative, (race_places[shallow] - 1)[:, None, None], axis=-1)[..., 0]
+    for r in np.flatnonzero(~shallow):
+        n = field_sizes[r]
+        place_prob[r, :n] = rank_probabilities(padded[r, :n], race_places[r]).sum(axis=1)
+
+    return pd.DataFrame({
+        'each_way_places': race_places[codes],
+        'each_way_fraction': race_fraction[codes],
+        'model_prob_place': place_prob[codes, slots],
+    }, index=runners.index)
+
+def _ordered_table(runners, strengths, race_col, horse_col, depth, min_prob):
+    """Long table of exact ordered finishing probabilities for the first depth (2 or 3) places"""
+    codes, uniques = pd.factorize(runners[race_col])
+    slots, field_sizes = card_slots(codes)
+    n_races, max_field = len(field_sizes), field_sizes.max(initial=0)
+
+    padded = np.full((n_races, max_field), -np.inf)
+    padded[codes, slots] = strengths
+    w = np.exp(padded - padded.max(axis=1, keepdims=True))
+    W = w.sum(axis=1)
+    horses = np.empty((n_races, max_field), dtype=object)
+    horses[codes, slots] = runners[horse_col].values
+
+    # P(i, j[, k]) = w_i / W * w_j / (W - w_i) [* w_k / (W - w_i - w_j)], repeats zeroed
+    eye = np.eye(max_field, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        first = w / W[:, None]
+        rest1 = W[:, None] - w
+        probs = first[:, :, None] * np.where(eye, 0.0, w[:, None, :] / rest1[:, :, None])
+        if depth == 3:
+            rest2 = rest1[:, :, None] - w[:, None, :]
+            third = np.where(eye[None, :, :, None] | eye[None, :, None, :] | eye[None, None, :, :],
+                             0.0, w[:, None, None, :] / rest2[:, :, :, None])
+            probs = probs[..., None] * third
+    probs = np.nan_to_num(probs)
+
+    keep = np.nonzero(probs > max(min_prob, 0.0))
+    race, positions = keep[0], keep[1:]
+    table = {race_col: uniques[race]}
+    for name, slot in zip(('first', 'second', 'third'), positions):
+        table[name] = horses[race, slot]
+    table['model_prob'] = probs[keep]
+    table['fair_odds'] = 1 / table['model_prob']
+    return pd.DataFrame(table)
+
+def forecast_table(runners, strengths, race_col='race_id', horse_col='horse_id', min_prob=0.0):
+    """Exact straight forecast (1st and 2nd in order) probabilities and fair odds for a card"""
+    return _ordered_table(runners, strengths, race_col, horse_col, 2, min_prob)
+
+def tricast_table(runners, strengths, race_col='race_id', horse_col='horse_id', min_prob=0.0):
+    """Exact tricast (1st, 2nd and 3rd in order) probabilities and fair odds for a card"""
+    return _ordered_table(runners, strengths, race_col, horse_col, 3, min_prob)
+
+def price_card(runners, beta_hat, scaler, features, race_col='race_id', horse_col='horse_id',
+               places=None, min_prob=0.0):
+    """Place/each-way prices per runner plus forecast and tricast tables for a whole card
+
+    When runners carry logOdds, the each-way columns compare the place part of
+    an each-way bet at the current win odds with the model's place probability.
+    Returns (runner prices, forecasts, tricasts).
+    """
+    strengths = card_strengths(runners, beta_hat, scaler, features)
+    prices = card_place_probabilities(runners, strengths, race_col, places)
+    prices['fair_place_odds'] = 1 / prices['model_prob_place']
+
+    if 'logOdds' in runners:
+        decimal_odds = np.exp(runners['logOdds']) + 1
+        prices['each_way_place_odds'] = 1 + (decimal_odds - 1) * prices['each_way_fraction']
+        prices['each_way_place_edge'] = prices['model_prob_place'] * prices['each_way_place_odds'] - 1
+
+    forecasts = forecast_table(runners, strengths, race_col, horse_col, min_prob)
+    tricasts = tricast_table(runners, strengths, race_col, horse_col, min_prob)
+    return prices, forecasts, tricasts
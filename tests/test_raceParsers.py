@@ -0,0 +1,61 @@
+import os
+import glob
+import unittest
+
+import raceParsers
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'pages')
+
+def load_pages():
+    """{file name: html} for every saved page fixture"""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+@unittest.skipUnless('lxml' in raceParsers.PARSER_BACKENDS, "lxml is not installed")
+class ParserParityTest(unittest.TestCase):
+    """The lxml backend must return exactly what the bs4 parsers return"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pages = load_pages()
+        cls.bs4 = raceParsers.PARSER_BACKENDS['bs4']
+        cls.lxml = raceParsers.PARSER_BACKENDS['lxml']
+
+    def test_backends_agree_on_every_fixture(self):
+        # Every page goes through every parser, including the ones for other page types
+        mismatches, _ = raceParsers.compare_backends(self.pages, 'lxml')
+        self.assertEqual(mismatches, [])
+
+    def test_race_page(self):
+        race = self.lxml['race_page'](self.pages['race_page.html'])
+        self.assertEqual((race['time'], race['location']), ('13:30', 'Ascot'))
+        self.assertEqual(race['track_length'], '5f 8y')
+        self.assertEqual(len(race['runners']), 4)
+        self.assertEqual(race['runners'][1]['Horse Name'], "O'Neill's Choice")
+        self.assertIsNone(race['runners'][2]['horse_href'])
+        self.assertEqual(race['runners'][3]['Jockey'], 'N/A')
+
+    def test_nested_racecard_link(self):
+        html = self.pages['intermediate_nested_link.html']
+        expected = '/racing/results/full-result/100002/ascot/01-03-2025'
+        self.assertEqual(self.bs4['intermediate_page'](html), expected)
+        self.assertEqual(self.lxml['intermediate_page'](html), expected)
+
+    def test_mixed_content_link_is_ignored(self):
+        # bs4's string= filter sees no single string inside mixed content
+        html = ('<div class="sdc-site-message--horseracing">'
+                '<a class="sdc-site-message__link" href="/racecard">View <b>Racecard</b></a></div>')
+        self.assertIsNone(self.bs4['intermediate_page'](html))
+        self.assertIsNone(self.lxml['intermediate_page'](html))
+
+    def test_whitespace_only_body(self):
+        html = self.pages['blank.html']
+        self.assertEqual(html.strip(), '')
+        for page_type in ('meeting_index', 'intermediate_page', 'racecard_or',
+                          'jockey_win_percentage', 'horse_win_percentage'):
+            with self.subTest(page_type=page_type):
+                self.assertEqual(self.lxml[page_type](html), self.bs4[page_type](html))
+        self.assertIsNone(self.lxml['intermediate_page'](html))
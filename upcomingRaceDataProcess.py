@@ -51,6 +51,11 @@ def main():
         except:
             return 0.0
 
+    def convert_position(position_str):
+        """Finishing position as an int; None before the race or for non-finishers"""
+        match = re.match(r'\s*(\d+)', position_str or '')
+        return int(match.group(1)) if match else None
+
     def convert_distance(distance_str):
         """Convert race distance to total yards with improved parsing"""
         try:
@@ -137,7 +142,8 @@ def main():
                     "odds": entry["Betting Odds"],
                     "trackLength": convert_distance(entry["trackLength"]),
                     "rating": int(entry["OfficialRating"]) if entry["OfficialRating"].isdigit() else 0,
-                    "form": convert_form(entry["Form"])
+                    "form": convert_form(entry["Form"]),
+                    "rank": convert_position(entry.get("Position", ""))
                 }
             })
             
@@ -166,7 +172,8 @@ def main():
                 "logOdds": entry["data"]["logOdds"],
                 "wdproduct": wdproduct,
                 "odds": entry["data"]["odds"],
-                "form": entry["data"]["form"]
+                "form": entry["data"]["form"],
+                "rank": entry["data"]["rank"]
             })
 
     # Load and process data as before
@@ -1,19 +1,25 @@
 import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
 import json
+import time
 from aiohttp import ClientTimeout
 import os
 from colorama import Fore, Back, Style, init
+from httpCache import open_cache, SingleFlight
+from raceParsers import select_parsers, parse_off_loop
 
 init()
 
 # Configuration
 USE_PROXIES = False
-REQUEST_DELAY = 0.3
 RETRY_DELAY = 0.3
-BATCH_SIZE = 10
+RACE_WORKERS = 10
+SAVE_INTERVAL = 5.0  # seconds between progress saves
 CONCURRENT_REQUESTS = 10
+HTTP_CACHE_DIR = ".http_cache"
+HTTP_CACHE_MAX_BYTES = 200 * 1024 * 1024
+PARSE_WORKERS = os.cpu_count()  # 0 parses on the event loop
+PARSER_BACKEND = None  # 'lxml' or 'bs4'; None uses lxml when installed
 
 # Load proxies
 if USE_PROXIES:
@@ -22,40 +28,60 @@ if USE_PROXIES:
 else:
     PROXY_LIST = []
 
+# Page parsers by page type for the chosen backend
+PARSERS = select_parsers(PARSER_BACKEND)
 
+# Disk cache of fetched pages (TTL per URL class, revalidated with ETag/Last-Modified)
+http_cache = open_cache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES)
+
+# Jockey/horse profile fetches shared by concurrent race pages
+profile_flights = SingleFlight()
 
 async def fetch_page(session, url, semaphore, retries=5):
+    cached = http_cache.fresh(url)
+    if cached is not None:
+        return cached
+    headers = http_cache.conditional_headers(url)
+    
     for attempt in range(retries):
         try:
             proxy = PROXY_LIST[attempt % len(PROXY_LIST)] if USE_PROXIES and PROXY_LIST else None
             async with semaphore:
-                async with session.get(url, proxy=proxy, timeout=ClientTimeout(total=10)) as response:
+                async with session.get(url, proxy=proxy, headers=headers, timeout=ClientTimeout(total=10)) as response:
+                    if response.status == 304:
+                        body = http_cache.revalidated(url)
+                        if body is not None:
+                            return body
+                        headers = {}
+                        continue
                     response.raise_for_status()
-                    return await response.text()
+                    body = await response.text()
+                    http_cache.store(url, body, response.headers)
+                    return body
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             print(f"Attempt {attempt + 1} failed for {url}: {e}")
             if attempt == retries - 1:
                 print(f"Failed to fetch {url} after {retries} attempts.")
+                stale = http_cache.stale(url)
+                if stale is not None:
+                    print(Fore.YELLOW + f"Using stale cached copy of {url}" + Style.RESET_ALL)
+                    return stale
                 print(Back.RED + "FAIL FAIL FAIL FAIL" + Style.RESET_ALL)
                 return None
             await asyncio.sleep(RETRY_DELAY * (2 ** attempt))
     return None
 
-async def extract_links(session, soup, base_url, semaphore):
+async def extract_links(session, meetings, base_url, semaphore):
     initial_links = []
     final_links = []
     
     # Collect initial links
-    for location in soup.find_all("div", {"class": "sdc-site-concertina-block__inner"}):
-        title_span = location.find("span", {"class": "sdc-site-concertina-block__title"})
-        if not title_span:
-            continue
-        title_text = title_span.text.strip()
+    for title_text, hrefs in meetings:
         if not any(x in title_text for x in ["(USA)", "(BRZ)", "(FR)", "(SAF)", "(ARG)"]):
             print("Skipping UK race:", title_text)
             continue
-        for link in location.find_all('a', {'class': 'sdc-site-racing-meetings__event-link'}):
-            initial_links.append(base_url + link['href'])
+        for href in hrefs:
+            initial_links.append(base_url + href)
 
     # Process intermediate pages
     async def process_intermediate_link(link):
@@ -63,14 +89,9 @@ async def extract_links(session, soup, base_url, semaphore):
         if not content:
             return None
             
-        intermediate_soup = BeautifulSoup(content, 'html.parser')
-        message_div = intermediate_soup.find('div', class_='sdc-site-message--horseracing')
-        
-        if message_div:
-            racecard_link = message_div.find('a', class_='sdc-site-message__link', 
-                                            string=lambda text: 'Racecard' in text)
-            if racecard_link:
-                return base_url + racecard_link['href']
+        racecard_href = await parse_off_loop(PARSERS['intermediate_page'], content, PARSE_WORKERS)
+        if racecard_href:
+            return base_url + racecard_href
         print(f"Racecard not found in intermediate page: {link}")
         return None
 
@@ -81,101 +102,46 @@ async def extract_links(session, soup, base_url, semaphore):
     return final_links
 
 async def get_racecard_or(session, racecard_url, base_url, semaphore):
-    or_data = {}
     page_content = await fetch_page(session, base_url + racecard_url, semaphore)
     if not page_content:
-        return or_data
-
-    soup = BeautifulSoup(page_content, 'html.parser')
-    for card in soup.find_all('div', {'class': 'sdc-site-racing-card__item'}):
-        name_tag = card.find('h4', {'class': 'sdc-site-racing-card__name'})
-        if name_tag:
-            horse_name = name_tag.text.strip()
-            or_tag = card.find('li', {'data-label': 'OR'})
-            or_data[horse_name] = or_tag.find('strong').text.strip() if or_tag else 'N/A'
-    return or_data
+        return {}
+    return await parse_off_loop(PARSERS['racecard_or'], page_content, PARSE_WORKERS)
 
 async def get_jockey_win_percentage(session, jockey_url, base_url, semaphore):
     try:
         content = await fetch_page(session, base_url + jockey_url, semaphore)
         if not content:
             return 'N/A'
-            
-        soup = BeautifulSoup(content, 'html.parser')
-        table = soup.find('table', class_='sdc-site-scrolling-table__table')
-        if not table:
-            return 'N/A'
-
-        for row in table.find_all('tr'):
-            cells = row.find_all('td')
-            if len(cells) >= 6 and 'Season (Jump)' in cells[0].get_text():
-                return cells[5].get_text(strip=True)
-        return 'N/A'
+        return await parse_off_loop(PARSERS['jockey_win_percentage'], content, PARSE_WORKERS)
     except Exception as e:
         print(f"Error getting jockey stats: {str(e)}")
         return 'N/A'
 
+async def get_horse_win_percentage(session, horse_link, semaphore):
+    """Horse win% from its profile page; None if the page or its stats table is missing"""
+    horse_content = await fetch_page(session, horse_link, semaphore)
+    if not horse_content:
+        return None
+    return await parse_off_loop(PARSERS['horse_win_percentage'], horse_content, PARSE_WORKERS)
+
 async def extract_data_from_race_page(session, url, base_url, all_horse_data, jockey_cache, semaphore):
-    await asyncio.sleep(REQUEST_DELAY)
     results = []
     
     page_content = await fetch_page(session, url, semaphore)
     if not page_content:
         return results
 
-    soup = BeautifulSoup(page_content, 'html.parser')
-    race_name_tag = soup.find("h3", {"class": "sdc-site-racing-header__description"})
-    race_name = race_name_tag.text.strip() if race_name_tag else "Unknown Race"
-    
-    # Track length extraction
-    track_length = "N/A"
-    for item in soup.find_all('li', {'class': 'sdc-site-racing-header__details-item'}):
-        if "Distance:" in item.text:
-            track_length = item.find('strong').next_sibling.strip()
-            break
+    race = await parse_off_loop(PARSERS['race_page'], page_content, PARSE_WORKERS)
 
     # Racecard OR data
-    racecard_link = soup.find('a', {'class': 'sdc-site-racing-status__link'})
     or_data = {}
-    if racecard_link:
-        or_data = await get_racecard_or(session, racecard_link['href'], base_url, semaphore)
-
-    race_title = soup.find("h2", {"class": "sdc-site-racing-header__name"}).text.strip()
-    race_time = race_title.split(" ", 1)[0]
-    race_location = race_title.split(" ", 1)[1]
+    if race['racecard_href']:
+        or_data = await get_racecard_or(session, race['racecard_href'], base_url, semaphore)
 
     # Process horses
-    for card in soup.find_all('div', {'class': 'sdc-site-racing-card__item'}):
-        race_position = card.find('span', {'class': 'sdc-site-racing-card__position'})
-        race_position = race_position.text.strip() if race_position else ''
-        
-        race_number = card.find('div', {'class': 'sdc-site-racing-card__number'})
-        race_number = race_number.text.strip() if race_number else ''
-        
-        horse_name_tag = card.find('h4', {'class': 'sdc-site-racing-card__name'})
-        horse_name = horse_name_tag.text.strip() if horse_name_tag else ''
-        
-        last_run_days = card.find('span', {'class': 'sdc-site-racing-card__last-run'})
-        last_run_days = last_run_days.text.strip() if last_run_days else ''
-        
-        betting_odds = card.find('span', {'class': 'sdc-site-racing-card__betting-odds'})
-        betting_odds = betting_odds.text.strip() if betting_odds else ''
-        
-        horse_form = card.find('li', {'data-label': 'Form'})
-        horse_form = horse_form.find('strong').text.strip() if horse_form else ''
-        
-        horse_age = card.find('li', {'data-label': 'Age'})
-        horse_age = horse_age.find('strong').text.strip() if horse_age else ''
-        
-        horse_weight = card.find('li', {'data-label': 'Wgt'})
-        horse_weight = horse_weight.find('strong').text.strip() if horse_weight else ''
-        
-        trainer = card.find('a', {'href': lambda x: x and '/racing/form-profiles/trainer/' in x})
-        trainer = trainer.text.strip() if trainer else ''
-        
-        jockey_tag = card.find('a', {'href': lambda x: x and '/racing/form-profiles/jockey/' in x})
-        jockey = jockey_tag.text.strip() if jockey_tag else 'N/A'
-        jockey_url = jockey_tag['href'] if jockey_tag else None
+    for runner in race['runners']:
+        horse_name = runner['Horse Name']
+        jockey_url = runner['jockey_href']
         
         # Jockey win percentage with caching
         jockey_win_percent = 'N/A'
@@ -183,58 +149,79 @@ async def extract_data_from_race_page(session, url, base_url, all_horse_data, jo
             if jockey_url in jockey_cache:
                 jockey_win_percent = jockey_cache[jockey_url]
             else:
-                jockey_win_percent = await get_jockey_win_percentage(session, jockey_url, base_url, semaphore)
+                jockey_win_percent = await profile_flights.run(
+                    ('jockey', jockey_url),
+                    lambda: get_jockey_win_percentage(session, jockey_url, base_url, semaphore)
+                )
                 jockey_cache[jockey_url] = jockey_win_percent
 
-        race_summary = card.find('p', {'class': 'sdc-site-racing-card__summary'})
-        race_summary = race_summary.text.strip() if race_summary else ''
-
         # Horse win percentage handling
         h_win_per = 'N/A'
-        horse_link_tag = horse_name_tag.find("a") if horse_name_tag else None
-        if horse_link_tag:
-            horse_name = horse_link_tag.text.strip()
-            horse_link = base_url + horse_link_tag["href"]
+        if runner['horse_href']:
+            horse_link = base_url + runner['horse_href']
             
             # Use cached data if available
             if horse_name in all_horse_data:
                 h_win_per = all_horse_data[horse_name].get("hWinPer", "N/A")
                 print(Fore.YELLOW + f"Using cached win% for {horse_name}" + Style.RESET_ALL)
             else:
-                # Fetch new data if not in cache
-                horse_content = await fetch_page(session, horse_link, semaphore)
-                if horse_content:
-                    horse_soup = BeautifulSoup(horse_content, 'html.parser')
-                    table = horse_soup.find('table', class_='sdc-site-scrolling-table__table')
-                    if table:
-                        tds = table.find_all('td')
-                        h_win_per = tds[5].text.strip() if len(tds) > 5 else 'N/A'
-                        all_horse_data[horse_name] = {"hWinPer": h_win_per}
-                        print(Fore.GREEN + f"Fetched new win% for {horse_name}" + Style.RESET_ALL)
+                # Fetch new data if not in cache (joining any fetch already in flight)
+                parsed = await profile_flights.run(
+                    ('horse', horse_link),
+                    lambda: get_horse_win_percentage(session, horse_link, semaphore)
+                )
+                if parsed is not None:
+                    h_win_per = parsed
+                    all_horse_data[horse_name] = {"hWinPer": h_win_per}
+                    print(Fore.GREEN + f"Fetched new win% for {horse_name}" + Style.RESET_ALL)
 
         results.append({
-            'Position': race_position,
-            'Number': race_number,
+            'Position': runner['Position'],
+            'Number': runner['Number'],
             'Horse Name': horse_name,
-            'Last Run Days': last_run_days,
-            'Betting Odds': betting_odds,
-            'Form': horse_form,
-            'Age': horse_age,
-            'Weight': horse_weight,
-            'Trainer': trainer,
-            'Jockey': jockey,
+            'Last Run Days': runner['Last Run Days'],
+            'Betting Odds': runner['Betting Odds'],
+            'Form': runner['Form'],
+            'Age': runner['Age'],
+            'Weight': runner['Weight'],
+            'Trainer': runner['Trainer'],
+            'Jockey': runner['Jockey'],
             'JockeyWinPercent': jockey_win_percent,
-            'Summary': race_summary,
-            "raceName": race_name,
-            "trackLength": track_length,
+            'Summary': runner['Summary'],
+            "raceName": race['race_name'],
+            "trackLength": race['track_length'],
             "OfficialRating": or_data.get(horse_name, 'N/A'),
             "hWinPer": h_win_per,
-            "time": race_time,
-            "location": race_location
+            "time": race['time'],
+            "location": race['location']
         })
 
     return results
 
+async def scrape_races(session, race_links, base_url, all_horse_data, jockey_cache, semaphore, on_result):
+    """Scrape race pages with RACE_WORKERS workers pulling links from a queue
+    
+    Each worker starts its next race as soon as its last one finishes (no batch
+    barrier) and calls on_result(index, race_results) for it; request
+    concurrency is still bounded by the shared semaphore.
+    """
+    queue = asyncio.Queue()
+    for item in enumerate(race_links):
+        queue.put_nowait(item)
+
+    async def worker():
+        while not queue.empty():
+            index, link = queue.get_nowait()
+            try:
+                race_results = await extract_data_from_race_page(
+                    session, link, base_url, all_horse_data, jockey_cache, semaphore)
+            except Exception as e:
+                print(Back.RED + f"Error scraping {link}: {str(e)}" + Style.RESET_ALL)
+                race_results = []
+            on_result(index, race_results)
+
+    await asyncio.gather(*(worker() for _ in range(min(RACE_WORKERS, len(race_links)))))
+
 # File handling functions
 def save_to_json(data, filename):
     with open(filename, 'w') as f:
@@ -258,9 +245,10 @@ async def main(date="21-03-2025", main_url='https://www.skysports.com/racing/res
     base_url = 'https://www.skysports.com'
     main_url = f"https://www.skysports.com/racing/results/{date}"
     semaphore = asyncio.Semaphore(CONCURRENT_REQUESTS)
+    http_cache.reset_stats()
+    profile_flights.reset()
     
     async with aiohttp.ClientSession() as session:
-        all_results = []
         all_horse_data = load_json("testHorseData.json")
         race_ids = load_json("testRaceIDs.json")
         jockey_cache = load_jockey_cache()
@@ -270,29 +258,39 @@ async def main(date="21-03-2025", main_url='https://www.skysports.com/racing/res
             print("Failed to fetch main page")
             return
 
-        soup = BeautifulSoup(page_content, 'html.parser')
-        race_links = await extract_links(session, soup, base_url, semaphore)
-
-        for i in range(0, len(race_links), BATCH_SIZE):
-            batch_links = race_links[i:i + BATCH_SIZE]
-            print(Back.GREEN + f"Processing batch {i//BATCH_SIZE + 1}/{(len(race_links)-1)//BATCH_SIZE + 1}" + Style.RESET_ALL)
+        meetings = await parse_off_loop(PARSERS['meeting_index'], page_content, PARSE_WORKERS)
+        race_links = await extract_links(session, meetings, base_url, semaphore)
 
-            tasks = [extract_data_from_race_page(session, link, base_url, all_horse_data, jockey_cache, semaphore) 
-                    for link in batch_links]
-            batch_results = await asyncio.gather(*tasks)
+        # Completed races by link index, written out in link order
+        scraped = {}
+        last_save = time.monotonic()
 
-            for race_results in batch_results:
-                if race_results:
-                    all_results.extend(race_results)
-                    if race_results:
-                        race_ids.append(race_results[0]["raceName"])
-
-            # Save progress after each batch
+        def save_progress():
+            all_results = []
+            new_race_ids = []
+            for index in sorted(scraped):
+                if scraped[index]:
+                    all_results.extend(scraped[index])
+                    new_race_ids.append(scraped[index][0]["raceName"])
             save_to_json(all_results, 'upcomingRace_results.json')
             save_to_json(all_horse_data, "testHorseData.json")
-            save_to_json(race_ids, "testRaceIDs.json")
+            save_to_json(race_ids + new_race_ids, "testRaceIDs.json")
             save_to_json(jockey_cache, "jockey_cache.json")
+            http_cache.save()
+
+        def on_result(index, race_results):
+            nonlocal last_save
+            scraped[index] = race_results
+            print(Back.GREEN + f"Scraped race {len(scraped)}/{len(race_links)}" + Style.RESET_ALL)
+            if time.monotonic() - last_save >= SAVE_INTERVAL:
+                save_progress()
+                last_save = time.monotonic()
+
+        await scrape_races(session, race_links, base_url, all_horse_data, jockey_cache, semaphore, on_result)
+        save_progress()
 
+        http_cache.print_report()
+        profile_flights.print_report()
         print(Back.BLUE + "\nAll data scraped successfully!" + Style.RESET_ALL)
 
 if __name__ == '__main__':